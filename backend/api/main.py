@@ -11,10 +11,18 @@ from fastapi import FastAPI, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 
-from .routes import contacts, tasks, projects, templates
-from .services.database import get_or_create_usuario, get_usuario, update_usuario, get_dashboard_stats
-from .services.email_service import test_smtp_connection, get_smtp_status
+from .routes import contacts, tasks, projects, templates, search, reminders
+from .services.database_async import (
+    get_or_create_usuario, get_usuario, update_usuario, get_dashboard_stats,
+    shutdown_executor
+)
+from .services.email_service import (
+    test_smtp_connection, get_smtp_status, close_async_smtp_pool
+)
+from .services.telegram_service import init_telegram_client, close_telegram_client
+from .services.rate_limiter import get_rate_limiter
 from .services.scheduler import start_scheduler, stop_scheduler, trigger_manual_check
+from .services.log_buffer import close_log_buffer
 from .models.schemas import UsuarioCreate, UsuarioUpdate, DashboardStats
 
 load_dotenv()
@@ -35,11 +43,16 @@ async def lifespan(app: FastAPI):
     """Lifecycle: startup y shutdown."""
     # Startup
     logger.info("🚀 Iniciando CRM API...")
+    init_telegram_client()
     start_scheduler()
     yield
     # Shutdown
     logger.info("👋 Cerrando CRM API...")
     stop_scheduler()
+    await close_log_buffer()
+    shutdown_executor()
+    await close_async_smtp_pool()
+    await close_telegram_client()
 
 
 # App
@@ -57,6 +70,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Incluir routers
@@ -64,6 +78,8 @@ app.include_router(contacts.router, prefix="/api")
 app.include_router(tasks.router, prefix="/api")
 app.include_router(projects.router, prefix="/api")
 app.include_router(templates.router, prefix="/api")
+app.include_router(search.router, prefix="/api")
+app.include_router(reminders.router, prefix="/api")
 
 
 # --- RUTAS PRINCIPALES ---
@@ -84,7 +100,8 @@ async def health():
     return {
         "status": "healthy",
         "database": "connected",
-        "scheduler": "running"
+        "scheduler": "running",
+        "telegram_queue": get_rate_limiter().queue_depth
     }
 
 
@@ -96,7 +113,7 @@ async def registrar_usuario(data: UsuarioCreate):
     Registra o actualiza un usuario.
     Se llama desde el bot de Telegram al hacer /start.
     """
-    usuario = get_or_create_usuario(
+    usuario = await get_or_create_usuario(
         telegram_id=data.telegram_id,
         nombre=data.nombre,
         email=data.email
@@ -107,7 +124,7 @@ async def registrar_usuario(data: UsuarioCreate):
 @app.get("/api/usuarios/me")
 async def obtener_mi_perfil(x_telegram_id: int = Header(...)):
     """Obtiene el perfil del usuario actual."""
-    usuario = get_usuario(x_telegram_id)
+    usuario = await get_usuario(x_telegram_id)
     if not usuario:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
     return usuario
@@ -121,7 +138,7 @@ async def actualizar_mi_perfil(
     """Actualiza el perfil del usuario actual."""
     update_data = {k: v for k, v in data.model_dump().items() if v is not None}
     
-    usuario = update_usuario(x_telegram_id, update_data)
+    usuario = await update_usuario(x_telegram_id, update_data)
     if not usuario:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
     return usuario
@@ -141,7 +158,7 @@ async def smtp_test():
     """
     Prueba la conexión SMTP del servidor.
     """
-    result = test_smtp_connection()
+    result = await test_smtp_connection()
     if not result["success"]:
         raise HTTPException(status_code=500, detail=result["error"])
     return result
@@ -152,7 +169,7 @@ async def smtp_test():
 @app.get("/api/dashboard", response_model=DashboardStats)
 async def obtener_dashboard(x_telegram_id: int = Header(...)):
     """Obtiene estadísticas para el dashboard."""
-    return get_dashboard_stats(x_telegram_id)
+    return await get_dashboard_stats(x_telegram_id)
 
 
 # --- UTILIDADES ---
@@ -155,6 +155,7 @@ class RecordatorioConfigUpdate(BaseModel):
 class RecordatorioConfig(RecordatorioConfigBase):
     id: int
     tarea_id: int
+    next_fire_at: Optional[datetime] = None  # Calculado en la BD
     created_at: datetime
 
     class Config:
@@ -177,6 +178,7 @@ class RecordatorioEnviadoCreate(RecordatorioEnviadoBase):
 
 class RecordatorioEnviado(RecordatorioEnviadoBase):
     id: int
+    usuario_telegram_id: Optional[int] = None
     fecha_envio: datetime
 
     class Config:
@@ -2,15 +2,17 @@
 Rutas API para Contactos
 """
 from typing import List, Optional
-from fastapi import APIRouter, HTTPException, Query, Header
+from fastapi import APIRouter, HTTPException, Query, Header, Response
 
 from ..models.schemas import (
     Contacto, ContactoCreate, ContactoUpdate, APIResponse
 )
-from ..services.database import (
-    create_contacto, get_contactos, get_contacto,
+from ..services.database import MAX_PAGE_SIZE
+from ..services.database_async import (
+    create_contacto, get_contactos_pagina, get_contacto,
     update_contacto, delete_contacto, get_historial_contacto
 )
+from .paginacion import responder_pagina
 
 router = APIRouter(prefix="/contactos", tags=["Contactos"])
 
@@ -22,11 +24,25 @@ def get_user_id(x_telegram_id: int = Header(...)) -> int:
 
 @router.get("/", response_model=List[Contacto])
 async def listar_contactos(
-    search: Optional[str] = Query(None, description="Buscar por nombre"),
+    response: Response,
+    search: Optional[str] = Query(None, description="Buscar por nombre, empresa o email"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Tamaño de página"),
+    cursor: Optional[str] = Query(None, description="Cursor devuelto en X-Next-Cursor"),
+    fields: Optional[str] = Query(None, description="Columnas separadas por coma, o 'summary'"),
     x_telegram_id: int = Header(...)
 ):
-    """Lista todos los contactos del usuario."""
-    return get_contactos(x_telegram_id, search)
+    """
+    Lista los contactos del usuario, paginados por (nombre, id).
+    Con `search` devuelve hasta `limit` resultados ordenados por similitud.
+    """
+    try:
+        pagina = await get_contactos_pagina(
+            x_telegram_id, search, limit=limit, cursor=cursor, fields=fields
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return responder_pagina(pagina, response, fields)
 
 
 @router.post("/", response_model=Contacto)
@@ -35,7 +51,7 @@ async def crear_contacto(
     x_telegram_id: int = Header(...)
 ):
     """Crea un nuevo contacto."""
-    result = create_contacto(x_telegram_id, data.model_dump())
+    result = await create_contacto(x_telegram_id, data.model_dump())
     if not result:
         raise HTTPException(status_code=500, detail="Error creando contacto")
     return result
@@ -47,7 +63,7 @@ async def obtener_contacto(
     x_telegram_id: int = Header(...)
 ):
     """Obtiene un contacto por ID."""
-    result = get_contacto(contacto_id, x_telegram_id)
+    result = await get_contacto(contacto_id, x_telegram_id)
     if not result:
         raise HTTPException(status_code=404, detail="Contacto no encontrado")
     return result
@@ -63,7 +79,7 @@ async def actualizar_contacto(
     # Filtrar campos None
     update_data = {k: v for k, v in data.model_dump().items() if v is not None}
     
-    result = update_contacto(contacto_id, x_telegram_id, update_data)
+    result = await update_contacto(contacto_id, x_telegram_id, update_data)
     if not result:
         raise HTTPException(status_code=404, detail="Contacto no encontrado")
     return result
@@ -75,7 +91,7 @@ async def eliminar_contacto(
     x_telegram_id: int = Header(...)
 ):
     """Elimina un contacto."""
-    success = delete_contacto(contacto_id, x_telegram_id)
+    success = await delete_contacto(contacto_id, x_telegram_id)
     if not success:
         raise HTTPException(status_code=404, detail="Contacto no encontrado")
     return {"success": True, "message": "Contacto eliminado"}
@@ -87,10 +103,5 @@ async def obtener_historial(
     x_telegram_id: int = Header(...),
     limit: int = Query(20, le=100)
 ):
-    """Obtiene el historial de interacciones con un contacto."""
-    # Verificar que el contacto existe y es del usuario
-    contacto = get_contacto(contacto_id, x_telegram_id)
-    if not contacto:
-        raise HTTPException(status_code=404, detail="Contacto no encontrado")
-    
-    return get_historial_contacto(contacto_id, limit)
+    """Obtiene el historial de interacciones con un contacto (filtrado por usuario)."""
+    return await get_historial_contacto(contacto_id, x_telegram_id, limit)
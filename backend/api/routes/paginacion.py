@@ -0,0 +1,20 @@
+"""
+Respuesta común de los listados paginados
+"""
+from typing import Dict, Optional
+from fastapi import Response
+from fastapi.responses import JSONResponse
+
+
+def responder_pagina(pagina: Dict, response: Response, fields: Optional[str] = None):
+    """
+    Devuelve los items de una página de `paginar` con el cursor siguiente
+    en el header X-Next-Cursor.
+    Con `fields` (proyección parcial) se responde tal cual, sin validar
+    contra el response_model de la ruta.
+    """
+    headers = {"X-Next-Cursor": pagina["next_cursor"]} if pagina["next_cursor"] else {}
+    if fields:
+        return JSONResponse(pagina["items"], headers=headers)
+    response.headers.update(headers)
+    return pagina["items"]
@@ -2,24 +2,37 @@
 Rutas API para Proyectos
 """
 from typing import List, Optional
-from fastapi import APIRouter, HTTPException, Query, Header
+from fastapi import APIRouter, HTTPException, Query, Header, Response
 
 from ..models.schemas import Proyecto, ProyectoCreate, ProyectoUpdate
-from ..services.database import (
-    create_proyecto, get_proyectos, get_proyecto,
-    update_proyecto, delete_proyecto, get_tareas
+from ..services.database import MAX_PAGE_SIZE
+from ..services.database_async import (
+    create_proyecto, get_proyectos_pagina, get_proyecto,
+    update_proyecto, delete_proyecto, get_tareas_pagina
 )
+from .paginacion import responder_pagina
 
 router = APIRouter(prefix="/proyectos", tags=["Proyectos"])
 
 
 @router.get("/", response_model=List[Proyecto])
 async def listar_proyectos(
+    response: Response,
     x_telegram_id: int = Header(...),
-    estado: Optional[str] = Query(None, description="Filtrar por estado")
+    estado: Optional[str] = Query(None, description="Filtrar por estado"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Tamaño de página"),
+    cursor: Optional[str] = Query(None, description="Cursor devuelto en X-Next-Cursor"),
+    fields: Optional[str] = Query(None, description="Columnas separadas por coma, o 'summary'"),
 ):
-    """Lista todos los proyectos del usuario."""
-    return get_proyectos(x_telegram_id, estado)
+    """Lista los proyectos del usuario, paginados por (created_at, id) descendente."""
+    try:
+        pagina = await get_proyectos_pagina(
+            x_telegram_id, estado, limit=limit, cursor=cursor, fields=fields
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return responder_pagina(pagina, response, fields)
 
 
 @router.post("/", response_model=Proyecto)
@@ -28,7 +41,7 @@ async def crear_proyecto(
     x_telegram_id: int = Header(...)
 ):
     """Crea un nuevo proyecto."""
-    result = create_proyecto(x_telegram_id, data.model_dump())
+    result = await create_proyecto(x_telegram_id, data.model_dump())
     if not result:
         raise HTTPException(status_code=500, detail="Error creando proyecto")
     return result
@@ -40,7 +53,7 @@ async def obtener_proyecto(
     x_telegram_id: int = Header(...)
 ):
     """Obtiene un proyecto por ID."""
-    result = get_proyecto(proyecto_id, x_telegram_id)
+    result = await get_proyecto(proyecto_id, x_telegram_id)
     if not result:
         raise HTTPException(status_code=404, detail="Proyecto no encontrado")
     return result
@@ -55,7 +68,7 @@ async def actualizar_proyecto(
     """Actualiza un proyecto."""
     update_data = {k: v for k, v in data.model_dump().items() if v is not None}
     
-    result = update_proyecto(proyecto_id, x_telegram_id, update_data)
+    result = await update_proyecto(proyecto_id, x_telegram_id, update_data)
     if not result:
         raise HTTPException(status_code=404, detail="Proyecto no encontrado")
     return result
@@ -67,7 +80,7 @@ async def eliminar_proyecto(
     x_telegram_id: int = Header(...)
 ):
     """Elimina un proyecto."""
-    success = delete_proyecto(proyecto_id, x_telegram_id)
+    success = await delete_proyecto(proyecto_id, x_telegram_id)
     if not success:
         raise HTTPException(status_code=404, detail="Proyecto no encontrado")
     return {"success": True, "message": "Proyecto eliminado"}
@@ -76,12 +89,20 @@ async def eliminar_proyecto(
 @router.get("/{proyecto_id}/tareas")
 async def listar_tareas_proyecto(
     proyecto_id: int,
-    x_telegram_id: int = Header(...)
+    response: Response,
+    x_telegram_id: int = Header(...),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Tamaño de página"),
+    cursor: Optional[str] = Query(None, description="Cursor devuelto en X-Next-Cursor"),
 ):
-    """Lista todas las tareas de un proyecto."""
-    # Verificar que el proyecto existe
-    proyecto = get_proyecto(proyecto_id, x_telegram_id)
-    if not proyecto:
-        raise HTTPException(status_code=404, detail="Proyecto no encontrado")
+    """
+    Lista las tareas de un proyecto, paginadas por (fecha_vencimiento, id)
+    (la consulta ya filtra por usuario).
+    """
+    try:
+        pagina = await get_tareas_pagina(
+            x_telegram_id, proyecto_id=proyecto_id, limit=limit, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    return get_tareas(x_telegram_id, proyecto_id=proyecto_id)
+    return responder_pagina(pagina, response)
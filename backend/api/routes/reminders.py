@@ -0,0 +1,31 @@
+"""
+Rutas API para Recordatorios enviados
+"""
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Query, Header, Response
+
+from ..models.schemas import RecordatorioEnviado
+from ..services.database import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from ..services.database_async import get_recordatorios_enviados_pagina
+from .paginacion import responder_pagina
+
+router = APIRouter(prefix="/recordatorios", tags=["Recordatorios"])
+
+
+@router.get("/enviados", response_model=List[RecordatorioEnviado])
+async def listar_recordatorios_enviados(
+    response: Response,
+    x_telegram_id: int = Header(...),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Tamaño de página"),
+    cursor: Optional[str] = Query(None, description="Cursor devuelto en X-Next-Cursor")
+):
+    """
+    Log de recordatorios enviados del usuario, del más reciente al más antiguo.
+    El cursor de la página siguiente viaja en el header X-Next-Cursor.
+    """
+    try:
+        pagina = await get_recordatorios_enviados_pagina(x_telegram_id, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return responder_pagina(pagina, response)
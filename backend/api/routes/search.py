@@ -0,0 +1,33 @@
+"""
+Rutas API para Búsqueda
+"""
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Query, Header
+
+from ..services.database import MAX_PAGE_SIZE, SEARCH_LIMIT
+from ..services.database_async import buscar_global
+
+router = APIRouter(prefix="/search", tags=["Búsqueda"])
+
+TIPOS_BUSQUEDA = ("tareas", "proyectos", "plantillas", "historial")
+
+
+@router.get("/")
+async def buscar(
+    x_telegram_id: int = Header(...),
+    q: str = Query(..., min_length=2, description="Texto a buscar"),
+    tipo: Optional[List[str]] = Query(None, description="Limitar a: tareas, proyectos, plantillas, historial"),
+    limit: int = Query(SEARCH_LIMIT, ge=1, le=MAX_PAGE_SIZE, description="Resultados por grupo"),
+    offset: int = Query(0, ge=0)
+):
+    """
+    Búsqueda de texto completo sobre tareas, proyectos, plantillas e historial.
+    Cada grupo trae {"total", "items"}; `highlight` es HTML seguro: el texto
+    del usuario viene escapado y las coincidencias se marcan con <mark>.
+    """
+    if tipo:
+        invalidos = [t for t in tipo if t not in TIPOS_BUSQUEDA]
+        if invalidos:
+            raise HTTPException(status_code=400, detail=f"Tipo inválido: {', '.join(invalidos)}")
+    
+    return await buscar_global(x_telegram_id, q, limit=limit, offset=offset, tipos=tipo)
@@ -1,69 +1,114 @@
 """
 Rutas API para Tareas
 """
+import asyncio
 from typing import List, Optional
 from datetime import datetime
-from fastapi import APIRouter, HTTPException, Query, Header
+from fastapi import APIRouter, HTTPException, Query, Header, Response
 
 from ..models.schemas import (
     Tarea, TareaCreate, TareaUpdate,
     RecordatorioConfig, RecordatorioConfigCreate
 )
-from ..services.database import (
-    create_tarea, get_tareas, get_tarea, get_tareas_pendientes_hoy,
+from ..services.database import MAX_PAGE_SIZE, KANBAN_PAGE_SIZE, KANBAN_ESTADOS
+from ..services.database_async import (
+    create_tarea, get_tareas_pagina, get_kanban_columna, get_tarea, get_tareas_hoy_pagina,
     update_tarea, delete_tarea, cambiar_estado_tarea,
     get_recordatorios_config, create_recordatorio_config, delete_recordatorio_config
 )
+from .paginacion import responder_pagina
 
 router = APIRouter(prefix="/tareas", tags=["Tareas"])
 
 
 @router.get("/", response_model=List[Tarea])
 async def listar_tareas(
+    response: Response,
     x_telegram_id: int = Header(...),
     estado: Optional[str] = Query(None, description="Filtrar por estado"),
     contacto_id: Optional[int] = Query(None, description="Filtrar por contacto"),
     proyecto_id: Optional[int] = Query(None, description="Filtrar por proyecto"),
     fecha_desde: Optional[datetime] = Query(None),
-    fecha_hasta: Optional[datetime] = Query(None)
+    fecha_hasta: Optional[datetime] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Tamaño de página"),
+    cursor: Optional[str] = Query(None, description="Cursor devuelto en X-Next-Cursor"),
+    fields: Optional[str] = Query(None, description="Columnas separadas por coma, o 'summary'"),
 ):
-    """Lista tareas con filtros opcionales."""
-    return get_tareas(
-        x_telegram_id,
-        estado=estado,
-        contacto_id=contacto_id,
-        proyecto_id=proyecto_id,
-        fecha_desde=fecha_desde,
-        fecha_hasta=fecha_hasta
-    )
+    """
+    Lista tareas con filtros opcionales, paginadas por (fecha_vencimiento, id).
+    El cursor de la página siguiente viaja en el header X-Next-Cursor.
+    """
+    try:
+        pagina = await get_tareas_pagina(
+            x_telegram_id,
+            estado=estado,
+            contacto_id=contacto_id,
+            proyecto_id=proyecto_id,
+            fecha_desde=fecha_desde,
+            fecha_hasta=fecha_hasta,
+            limit=limit,
+            cursor=cursor,
+            fields=fields
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return responder_pagina(pagina, response, fields)
 
 
 @router.get("/hoy", response_model=List[Tarea])
-async def listar_tareas_hoy(x_telegram_id: int = Header(...)):
-    """Lista tareas pendientes para hoy."""
-    return get_tareas_pendientes_hoy(x_telegram_id)
+async def listar_tareas_hoy(
+    response: Response,
+    x_telegram_id: int = Header(...),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Tamaño de página"),
+    cursor: Optional[str] = Query(None, description="Cursor devuelto en X-Next-Cursor"),
+):
+    """Lista tareas pendientes para hoy, paginadas por (fecha_vencimiento, id)."""
+    try:
+        pagina = await get_tareas_hoy_pagina(x_telegram_id, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return responder_pagina(pagina, response)
 
 
 @router.get("/kanban")
-async def obtener_kanban(x_telegram_id: int = Header(...)):
+async def obtener_kanban(
+    x_telegram_id: int = Header(...),
+    limit: int = Query(KANBAN_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Tarjetas por columna"),
+    fields: Optional[str] = Query(None, description="Columnas separadas por coma, o 'summary'"),
+):
     """
     Obtiene tareas organizadas para vista Kanban.
+    Cada columna trae {"items", "total", "next_cursor"}; las columnas
+    se consultan en paralelo y cada una lee solo sus primeras `limit` tarjetas.
     """
-    tareas = get_tareas(x_telegram_id)
-    
-    kanban = {
-        "pendiente": [],
-        "en_seguimiento": [],
-        "esperando_respuesta": [],
-        "completado": []
-    }
-    
-    for tarea in tareas:
-        estado = tarea.get("estado", "pendiente")
-        if estado in kanban:
-            kanban[estado].append(tarea)
+    try:
+        columnas = await asyncio.gather(*(
+            get_kanban_columna(x_telegram_id, estado, limit=limit, fields=fields)
+            for estado in KANBAN_ESTADOS
+        ))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return dict(zip(KANBAN_ESTADOS, columnas))
+
+
+@router.get("/kanban/{estado}")
+async def obtener_kanban_columna(
+    estado: str,
+    x_telegram_id: int = Header(...),
+    limit: int = Query(KANBAN_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Tarjetas por página"),
+    cursor: Optional[str] = Query(None, description="next_cursor de la columna"),
+    fields: Optional[str] = Query(None, description="Columnas separadas por coma, o 'summary'"),
+):
+    """Carga más tarjetas de una columna del Kanban."""
+    if estado not in KANBAN_ESTADOS:
+        raise HTTPException(status_code=404, detail="Columna no encontrada")
     
-    return kanban
+    try:
+        return await get_kanban_columna(x_telegram_id, estado, limit=limit, cursor=cursor, fields=fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.post("/", response_model=Tarea)
@@ -71,22 +116,12 @@ async def crear_tarea(
     data: TareaCreate,
     x_telegram_id: int = Header(...)
 ):
-    """Crea una nueva tarea con recordatorios opcionales."""
-    # Extraer recordatorios si existen
-    recordatorios = None
-    tarea_data = data.model_dump()
-    
-    if "recordatorios" in tarea_data:
-        recordatorios_raw = tarea_data.pop("recordatorios")
-        if recordatorios_raw:
-            recordatorios = []
-            for rec in recordatorios_raw:
-                # Convertir time a string si es necesario
-                if hasattr(rec.get("hora"), "isoformat"):
-                    rec["hora"] = rec["hora"].isoformat()
-                recordatorios.append(rec)
+    """Crea una nueva tarea con recordatorios opcionales (una sola llamada atómica)."""
+    # mode="json": fechas y horas como string ISO
+    tarea_data = data.model_dump(mode="json")
+    recordatorios = tarea_data.pop("recordatorios", None)
     
-    result = create_tarea(x_telegram_id, tarea_data, recordatorios)
+    result = await create_tarea(x_telegram_id, tarea_data, recordatorios)
     if not result:
         raise HTTPException(status_code=500, detail="Error creando tarea")
     return result
@@ -98,7 +133,7 @@ async def obtener_tarea(
     x_telegram_id: int = Header(...)
 ):
     """Obtiene una tarea por ID."""
-    result = get_tarea(tarea_id, x_telegram_id)
+    result = await get_tarea(tarea_id, x_telegram_id)
     if not result:
         raise HTTPException(status_code=404, detail="Tarea no encontrada")
     return result
@@ -113,7 +148,7 @@ async def actualizar_tarea(
     """Actualiza una tarea."""
     update_data = {k: v for k, v in data.model_dump().items() if v is not None}
     
-    result = update_tarea(tarea_id, x_telegram_id, update_data)
+    result = await update_tarea(tarea_id, x_telegram_id, update_data)
     if not result:
         raise HTTPException(status_code=404, detail="Tarea no encontrada")
     return result
@@ -130,7 +165,7 @@ async def cambiar_estado(
     if estado not in estados_validos:
         raise HTTPException(status_code=400, detail=f"Estado inválido. Usar: {estados_validos}")
     
-    result = cambiar_estado_tarea(tarea_id, x_telegram_id, estado)
+    result = await cambiar_estado_tarea(tarea_id, x_telegram_id, estado)
     if not result:
         raise HTTPException(status_code=404, detail="Tarea no encontrada")
     return result
@@ -142,7 +177,7 @@ async def eliminar_tarea(
     x_telegram_id: int = Header(...)
 ):
     """Elimina una tarea."""
-    success = delete_tarea(tarea_id, x_telegram_id)
+    success = await delete_tarea(tarea_id, x_telegram_id)
     if not success:
         raise HTTPException(status_code=404, detail="Tarea no encontrada")
     return {"success": True, "message": "Tarea eliminada"}
@@ -155,13 +190,8 @@ async def listar_recordatorios(
     tarea_id: int,
     x_telegram_id: int = Header(...)
 ):
-    """Lista recordatorios configurados de una tarea."""
-    # Verificar que la tarea existe y es del usuario
-    tarea = get_tarea(tarea_id, x_telegram_id)
-    if not tarea:
-        raise HTTPException(status_code=404, detail="Tarea no encontrada")
-    
-    return get_recordatorios_config(tarea_id)
+    """Lista recordatorios configurados de una tarea (vacío si no es del usuario)."""
+    return await get_recordatorios_config(tarea_id, x_telegram_id)
 
 
 @router.post("/{tarea_id}/recordatorios", response_model=RecordatorioConfig)
@@ -171,18 +201,14 @@ async def agregar_recordatorio(
     x_telegram_id: int = Header(...)
 ):
     """Agrega un recordatorio a una tarea."""
-    # Verificar que la tarea existe y es del usuario
-    tarea = get_tarea(tarea_id, x_telegram_id)
-    if not tarea:
-        raise HTTPException(status_code=404, detail="Tarea no encontrada")
-    
     rec_data = data.model_dump()
     if hasattr(rec_data.get("hora"), "isoformat"):
         rec_data["hora"] = rec_data["hora"].isoformat()
     
-    result = create_recordatorio_config(tarea_id, rec_data)
+    # El INSERT verifica que la tarea sea del usuario
+    result = await create_recordatorio_config(tarea_id, rec_data, x_telegram_id)
     if not result:
-        raise HTTPException(status_code=500, detail="Error creando recordatorio")
+        raise HTTPException(status_code=404, detail="Tarea no encontrada")
     return result
 
 
@@ -193,12 +219,7 @@ async def eliminar_recordatorio(
     x_telegram_id: int = Header(...)
 ):
     """Elimina un recordatorio de una tarea."""
-    # Verificar que la tarea existe y es del usuario
-    tarea = get_tarea(tarea_id, x_telegram_id)
-    if not tarea:
-        raise HTTPException(status_code=404, detail="Tarea no encontrada")
-    
-    success = delete_recordatorio_config(recordatorio_id)
+    success = await delete_recordatorio_config(recordatorio_id, tarea_id, x_telegram_id)
     if not success:
         raise HTTPException(status_code=404, detail="Recordatorio no encontrado")
     return {"success": True, "message": "Recordatorio eliminado"}
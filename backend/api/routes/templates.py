@@ -2,25 +2,38 @@
 Rutas API para Plantillas
 """
 from typing import List, Optional
-from fastapi import APIRouter, HTTPException, Query, Header
+from fastapi import APIRouter, HTTPException, Query, Header, Response
 
 from ..models.schemas import Plantilla, PlantillaCreate, PlantillaUpdate
-from ..services.database import (
-    create_plantilla, get_plantillas, get_plantilla,
+from ..services.database import MAX_PAGE_SIZE
+from ..services.database_async import (
+    create_plantilla, get_plantillas_pagina, get_plantilla,
     update_plantilla, delete_plantilla
 )
 from ..services.email_service import render_template
+from .paginacion import responder_pagina
 
 router = APIRouter(prefix="/plantillas", tags=["Plantillas"])
 
 
 @router.get("/", response_model=List[Plantilla])
 async def listar_plantillas(
+    response: Response,
     x_telegram_id: int = Header(...),
-    tipo: Optional[str] = Query(None, description="Filtrar por tipo: email, telegram")
+    tipo: Optional[str] = Query(None, description="Filtrar por tipo: email, telegram"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Tamaño de página"),
+    cursor: Optional[str] = Query(None, description="Cursor devuelto en X-Next-Cursor"),
+    fields: Optional[str] = Query(None, description="Columnas separadas por coma, o 'summary'"),
 ):
-    """Lista todas las plantillas del usuario."""
-    return get_plantillas(x_telegram_id, tipo)
+    """Lista las plantillas del usuario, paginadas por (nombre, id)."""
+    try:
+        pagina = await get_plantillas_pagina(
+            x_telegram_id, tipo, limit=limit, cursor=cursor, fields=fields
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return responder_pagina(pagina, response, fields)
 
 
 @router.post("/", response_model=Plantilla)
@@ -32,7 +45,7 @@ async def crear_plantilla(
     if data.tipo not in ["email", "telegram"]:
         raise HTTPException(status_code=400, detail="Tipo debe ser 'email' o 'telegram'")
     
-    result = create_plantilla(x_telegram_id, data.model_dump())
+    result = await create_plantilla(x_telegram_id, data.model_dump())
     if not result:
         raise HTTPException(status_code=500, detail="Error creando plantilla")
     return result
@@ -65,7 +78,7 @@ async def obtener_plantilla(
     x_telegram_id: int = Header(...)
 ):
     """Obtiene una plantilla por ID."""
-    result = get_plantilla(plantilla_id, x_telegram_id)
+    result = await get_plantilla(plantilla_id, x_telegram_id)
     if not result:
         raise HTTPException(status_code=404, detail="Plantilla no encontrada")
     return result
@@ -83,7 +96,7 @@ async def actualizar_plantilla(
     if "tipo" in update_data and update_data["tipo"] not in ["email", "telegram"]:
         raise HTTPException(status_code=400, detail="Tipo debe ser 'email' o 'telegram'")
     
-    result = update_plantilla(plantilla_id, x_telegram_id, update_data)
+    result = await update_plantilla(plantilla_id, x_telegram_id, update_data)
     if not result:
         raise HTTPException(status_code=404, detail="Plantilla no encontrada")
     return result
@@ -95,7 +108,7 @@ async def eliminar_plantilla(
     x_telegram_id: int = Header(...)
 ):
     """Elimina una plantilla."""
-    success = delete_plantilla(plantilla_id, x_telegram_id)
+    success = await delete_plantilla(plantilla_id, x_telegram_id)
     if not success:
         raise HTTPException(status_code=404, detail="Plantilla no encontrada")
     return {"success": True, "message": "Plantilla eliminada"}
@@ -110,7 +123,7 @@ async def preview_plantilla(
     """
     Genera un preview de la plantilla con variables de ejemplo.
     """
-    plantilla = get_plantilla(plantilla_id, x_telegram_id)
+    plantilla = await get_plantilla(plantilla_id, x_telegram_id)
     if not plantilla:
         raise HTTPException(status_code=404, detail="Plantilla no encontrada")
     
@@ -129,10 +142,10 @@ async def preview_plantilla(
         }
     
     preview = {
-        "mensaje": render_template(plantilla["mensaje"], variables)
+        "mensaje": render_template(plantilla["mensaje"], variables, plantilla_id)
     }
     
     if plantilla.get("asunto"):
-        preview["asunto"] = render_template(plantilla["asunto"], variables)
+        preview["asunto"] = render_template(plantilla["asunto"], variables, plantilla_id)
     
     return preview
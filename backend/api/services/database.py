@@ -2,9 +2,13 @@
 Servicio de Base de Datos - Conexión a Supabase
 """
 import os
+import json
+import base64
 import logging
-from typing import Optional, List, Dict, Any
-from datetime import datetime, date, time, timedelta
+import threading
+from time import monotonic
+from typing import Optional, List, Dict, Any, Tuple, Iterable
+from datetime import datetime, date, time
 
 from dotenv import load_dotenv
 from supabase import create_client, Client
@@ -21,25 +25,195 @@ TIMEZONE = os.getenv("TIMEZONE", "America/Argentina/Buenos_Aires")
 
 TZ = pytz.timezone(TIMEZONE)
 
+# Paginación: tamaño por defecto y tope duro de filas por consulta
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "500"))
+KANBAN_PAGE_SIZE = int(os.getenv("KANBAN_PAGE_SIZE", "20"))
+SEARCH_LIMIT = int(os.getenv("SEARCH_LIMIT", "20"))
+
+# Columnas del tablero Kanban, en orden
+KANBAN_ESTADOS = ("pendiente", "en_seguimiento", "esperando_respuesta", "completado")
+
+# Caché de plantillas por defecto (segundos)
+PLANTILLA_CACHE_TTL = float(os.getenv("PLANTILLA_CACHE_TTL", "300"))
+
 # Cliente Supabase
 _supabase: Optional[Client] = None
+_supabase_lock = threading.Lock()
 
 def get_supabase() -> Client:
-    """Obtiene el cliente de Supabase (singleton)."""
+    """Obtiene el cliente de Supabase (singleton, seguro entre hilos)."""
     global _supabase
     if _supabase is None:
-        if not SUPABASE_URL or not SUPABASE_KEY:
-            raise ValueError("SUPABASE_URL y SUPABASE_KEY son requeridos")
-        _supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-        logger.info("✅ Conectado a Supabase")
+        with _supabase_lock:
+            if _supabase is None:
+                if not SUPABASE_URL or not SUPABASE_KEY:
+                    raise ValueError("SUPABASE_URL y SUPABASE_KEY son requeridos")
+                _supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+                logger.info("✅ Conectado a Supabase")
     return _supabase
 
 
+# =============================================
+# PAGINACIÓN (KEYSET)
+# =============================================
+def encode_cursor(valor: Any, ultimo_id: int) -> str:
+    """Cursor opaco con el último (valor de orden, id) entregado."""
+    raw = json.dumps([valor, ultimo_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, int]:
+    """Decodifica un cursor; lanza ValueError si es inválido."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        valor, ultimo_id = json.loads(raw)
+        return valor, int(ultimo_id)
+    except Exception:
+        raise ValueError("Cursor inválido")
+
+
+def _pg_value(valor: Any) -> str:
+    """Escapa un valor para usarlo dentro de un filtro or=(...) de PostgREST."""
+    texto = str(valor).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{texto}"'
+
+
+def _keyset_filter(columna: str, valor: Any, ultimo_id: int, desc: bool) -> str:
+    """
+    Filas posteriores a (valor, id) en el orden (columna, id).
+    Postgres ordena NULLS LAST en ASC y NULLS FIRST en DESC.
+    """
+    op = "lt" if desc else "gt"
+    if valor is None:
+        despues_null = f"and({columna}.is.null,id.{op}.{ultimo_id})"
+        return f"{columna}.not.is.null,{despues_null}" if desc else despues_null
+    
+    v = _pg_value(valor)
+    condiciones = [f"{columna}.{op}.{v}", f"and({columna}.eq.{v},id.{op}.{ultimo_id})"]
+    if not desc:
+        condiciones.append(f"{columna}.is.null")
+    return ",".join(condiciones)
+
+
+def paginar(query, columna: str, limit: int = None, cursor: str = None, desc: bool = False) -> Dict:
+    """
+    Ejecuta una consulta con paginación keyset sobre (columna, id).
+    Devuelve {"items": [...], "next_cursor": str | None}, más "total"
+    si la consulta se armó con select(..., count="exact").
+    Sin `limit` usa DEFAULT_PAGE_SIZE; nunca trae más de MAX_PAGE_SIZE filas.
+    """
+    limit = max(1, min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+    
+    if cursor:
+        valor, ultimo_id = decode_cursor(cursor)
+        query = query.or_(_keyset_filter(columna, valor, ultimo_id, desc))
+    
+    resp = query.order(columna, desc=desc).order("id", desc=desc).limit(limit + 1).execute()
+    items = resp.data or []
+    
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(items[-1].get(columna), items[-1]["id"])
+    
+    pagina = {"items": items, "next_cursor": next_cursor}
+    if resp.count is not None:
+        pagina["total"] = resp.count
+    return pagina
+
+
+# =============================================
+# PROYECCIONES (select explícitos)
+# =============================================
+# Columnas de cada tabla expuestas por la API (sin columnas internas
+# como busqueda o fts).
+COLUMNAS = {
+    "contactos": (
+        "id", "usuario_telegram_id", "nombre", "email", "telefono", "telegram_id",
+        "empresa", "notas", "created_at", "updated_at"
+    ),
+    "proyectos": (
+        "id", "usuario_telegram_id", "nombre", "descripcion", "contacto_id", "estado",
+        "created_at", "updated_at"
+    ),
+    "tareas": (
+        "id", "usuario_telegram_id", "titulo", "descripcion", "contacto_id", "proyecto_id",
+        "fecha_vencimiento", "estado", "prioridad", "frecuencia_repeticion",
+        "canal_notificacion", "plantilla_id", "created_at", "updated_at"
+    ),
+    "plantillas": (
+        "id", "usuario_telegram_id", "nombre", "tipo", "asunto", "mensaje", "es_default",
+        "created_at"
+    ),
+    "historial_interacciones": (
+        "id", "usuario_telegram_id", "contacto_id", "tarea_id", "tipo", "descripcion",
+        "metadata", "created_at"
+    ),
+}
+
+# Relaciones embebidas que se pueden pedir como campo
+RELACIONES = {
+    "contactos": {},
+    "proyectos": {"contactos": "contactos(nombre)"},
+    "tareas": {
+        "contactos": "contactos(id, nombre, email)",
+        "proyectos": "proyectos(id, nombre)",
+    },
+    "plantillas": {},
+    "historial_interacciones": {},
+}
+
+# fields=summary: lo mínimo para listar (bot, selects del frontend)
+RESUMEN = {
+    "contactos": ("id", "nombre", "empresa", "email", "telegram_id"),
+    "proyectos": ("id", "nombre", "estado", "descripcion"),
+    "tareas": ("id", "titulo", "estado", "prioridad", "fecha_vencimiento", "contactos"),
+    "plantillas": ("id", "nombre", "tipo", "es_default"),
+}
+
+
+def _campos(tabla: str, fields: str = None, requeridas: Tuple[str, ...] = ("id",)) -> Tuple[str, ...]:
+    """
+    Traduce `fields` a la tupla de campos pedidos.
+    None -> todas las columnas y relaciones; "summary" -> RESUMEN;
+    si no, nombres separados por coma. Las columnas `requeridas`
+    (id y la de orden, para la paginación) se agregan siempre.
+    Lanza ValueError si se pide un campo desconocido.
+    """
+    columnas = COLUMNAS[tabla]
+    relaciones = RELACIONES[tabla]
+    
+    if not fields:
+        campos = columnas + tuple(relaciones)
+    elif fields == "summary":
+        campos = RESUMEN[tabla]
+    else:
+        campos = tuple(c.strip() for c in fields.split(",") if c.strip())
+        desconocidos = [c for c in campos if c not in columnas and c not in relaciones]
+        if desconocidos:
+            raise ValueError(f"Campos desconocidos: {', '.join(desconocidos)}")
+    
+    return tuple(dict.fromkeys(requeridas + campos))
+
+
+def proyeccion(tabla: str, fields: str = None, requeridas: Tuple[str, ...] = ("id",)) -> str:
+    """Lista de columnas de select() para `fields` (ver _campos)."""
+    relaciones = RELACIONES[tabla]
+    return ", ".join(relaciones.get(c, c) for c in _campos(tabla, fields, requeridas))
+
+
 # =============================================
 # USUARIOS
 # =============================================
 def get_or_create_usuario(telegram_id: int, nombre: str, email: str = None) -> Dict:
-    """Obtiene o crea un usuario por su telegram_id."""
+    """
+    Obtiene o crea un usuario por su telegram_id.
+    Usuario existente: una lectura por clave primaria.
+    Usuario nuevo: RPC registrar_usuario, que hace el alta idempotente
+    (ON CONFLICT DO NOTHING) y crea las plantillas por defecto en la
+    misma transacción; si dos registros llegan juntos solo uno las crea.
+    """
     db = get_supabase()
     
     # Buscar existente
@@ -49,18 +223,17 @@ def get_or_create_usuario(telegram_id: int, nombre: str, email: str = None) -> D
         return resp.data[0]
     
     # Crear nuevo
-    new_user = {
-        "telegram_id": telegram_id,
-        "nombre": nombre,
-        "email": email,
-        "timezone": TIMEZONE
-    }
-    resp = db.table("usuarios").insert(new_user).execute()
+    resp = db.rpc("registrar_usuario", {
+        "p_telegram_id": telegram_id,
+        "p_nombre": nombre,
+        "p_email": email,
+        "p_timezone": TIMEZONE,
+        "p_plantillas": PLANTILLAS_DEFAULT
+    }).execute()
     
     if resp.data:
-        # Crear plantillas por defecto
-        create_default_plantillas(telegram_id)
-        return resp.data[0]
+        invalidate_plantillas_cache(telegram_id)
+        return resp.data
     
     raise Exception("Error creando usuario")
 
@@ -90,22 +263,53 @@ def create_contacto(usuario_telegram_id: int, data: Dict) -> Dict:
     return resp.data[0] if resp.data else None
 
 
-def get_contactos(usuario_telegram_id: int, search: str = None) -> List[Dict]:
-    """Lista contactos de un usuario."""
-    db = get_supabase()
-    query = db.table("contactos").select("*").eq("usuario_telegram_id", usuario_telegram_id)
-    
+def get_contactos(usuario_telegram_id: int, search: str = None, fields: str = None) -> List[Dict]:
+    """Lista contactos de un usuario (hasta MAX_PAGE_SIZE)."""
+    if search:
+        return buscar_contactos(usuario_telegram_id, search, fields=fields)
+    return get_contactos_pagina(usuario_telegram_id, limit=MAX_PAGE_SIZE, fields=fields)["items"]
+
+
+def buscar_contactos(usuario_telegram_id: int, search: str, limit: int = None, fields: str = None) -> List[Dict]:
+    """
+    Búsqueda difusa por nombre, empresa y email (pg_trgm).
+    Resultados ordenados por similitud, como máximo `limit`.
+    """
+    campos = _campos("contactos", fields)
+    db = get_supabase()
+    resp = db.rpc("buscar_contactos", {
+        "p_usuario": usuario_telegram_id,
+        "p_termino": search.strip(),
+        "p_limite": max(1, min(limit or SEARCH_LIMIT, MAX_PAGE_SIZE))
+    }).execute()
+    # El RPC devuelve filas completas: se aplica la misma proyección que en select()
+    return [{c: fila[c] for c in campos if c in fila} for fila in resp.data or []]
+
+
+def get_contactos_pagina(
+    usuario_telegram_id: int,
+    search: str = None,
+    limit: int = None,
+    cursor: str = None,
+    fields: str = None
+) -> Dict:
+    """
+    Página de contactos ordenada por (nombre, id).
+    Con `search` devuelve los mejores resultados por similitud (sin cursor).
+    """
     if search:
-        query = query.ilike("nombre", f"%{search}%")
+        return {"items": buscar_contactos(usuario_telegram_id, search, limit, fields), "next_cursor": None}
     
-    resp = query.order("nombre").execute()
-    return resp.data or []
+    db = get_supabase()
+    query = db.table("contactos").select(proyeccion("contactos", fields, ("id", "nombre")))\
+        .eq("usuario_telegram_id", usuario_telegram_id)
+    return paginar(query, "nombre", limit, cursor)
 
 
 def get_contacto(contacto_id: int, usuario_telegram_id: int) -> Optional[Dict]:
     """Obtiene un contacto por ID."""
     db = get_supabase()
-    resp = db.table("contactos").select("*")\
+    resp = db.table("contactos").select(proyeccion("contactos"))\
         .eq("id", contacto_id)\
         .eq("usuario_telegram_id", usuario_telegram_id)\
         .execute()
@@ -143,23 +347,33 @@ def create_proyecto(usuario_telegram_id: int, data: Dict) -> Dict:
     return resp.data[0] if resp.data else None
 
 
-def get_proyectos(usuario_telegram_id: int, estado: str = None) -> List[Dict]:
-    """Lista proyectos de un usuario."""
+def get_proyectos(usuario_telegram_id: int, estado: str = None, fields: str = None) -> List[Dict]:
+    """Lista proyectos de un usuario (hasta MAX_PAGE_SIZE)."""
+    return get_proyectos_pagina(usuario_telegram_id, estado, limit=MAX_PAGE_SIZE, fields=fields)["items"]
+
+
+def get_proyectos_pagina(
+    usuario_telegram_id: int,
+    estado: str = None,
+    limit: int = None,
+    cursor: str = None,
+    fields: str = None
+) -> Dict:
+    """Página de proyectos ordenada por (created_at, id) descendente."""
     db = get_supabase()
-    query = db.table("proyectos").select("*, contactos(nombre)")\
+    query = db.table("proyectos").select(proyeccion("proyectos", fields, ("id", "created_at")))\
         .eq("usuario_telegram_id", usuario_telegram_id)
     
     if estado:
         query = query.eq("estado", estado)
     
-    resp = query.order("created_at", desc=True).execute()
-    return resp.data or []
+    return paginar(query, "created_at", limit, cursor, desc=True)
 
 
 def get_proyecto(proyecto_id: int, usuario_telegram_id: int) -> Optional[Dict]:
     """Obtiene un proyecto por ID."""
     db = get_supabase()
-    resp = db.table("proyectos").select("*, contactos(nombre)")\
+    resp = db.table("proyectos").select(proyeccion("proyectos"))\
         .eq("id", proyecto_id)\
         .eq("usuario_telegram_id", usuario_telegram_id)\
         .execute()
@@ -190,25 +404,23 @@ def delete_proyecto(proyecto_id: int, usuario_telegram_id: int) -> bool:
 # TAREAS
 # =============================================
 def create_tarea(usuario_telegram_id: int, data: Dict, recordatorios: List[Dict] = None) -> Dict:
-    """Crea una nueva tarea con recordatorios opcionales."""
+    """
+    Crea una nueva tarea con recordatorios opcionales.
+    Todo en una sola llamada atómica (RPC crear_tarea_con_recordatorios):
+    si falla algún recordatorio no queda la tarea huérfana.
+    Devuelve la tarea con sus recordatorios en "recordatorios".
+    """
     db = get_supabase()
-    data["usuario_telegram_id"] = usuario_telegram_id
-    
-    # Crear tarea
-    resp = db.table("tareas").insert(data).execute()
+    resp = db.rpc("crear_tarea_con_recordatorios", {
+        "p_usuario": usuario_telegram_id,
+        "p_tarea": data,
+        "p_recordatorios": recordatorios or []
+    }).execute()
     
     if not resp.data:
         raise Exception("Error creando tarea")
     
-    tarea = resp.data[0]
-    
-    # Crear recordatorios si se proporcionan
-    if recordatorios:
-        for rec in recordatorios:
-            rec["tarea_id"] = tarea["id"]
-            db.table("recordatorios_config").insert(rec).execute()
-    
-    return tarea
+    return resp.data
 
 
 def get_tareas(
@@ -217,15 +429,45 @@ def get_tareas(
     contacto_id: int = None,
     proyecto_id: int = None,
     fecha_desde: datetime = None,
-    fecha_hasta: datetime = None
+    fecha_hasta: datetime = None,
+    fields: str = None,
+    excluir_estado: str = None
 ) -> List[Dict]:
-    """Lista tareas con filtros opcionales."""
-    db = get_supabase()
-    query = db.table("tareas").select("*, contactos(id, nombre, email), proyectos(id, nombre)")\
+    """Lista tareas con filtros opcionales (hasta MAX_PAGE_SIZE)."""
+    return get_tareas_pagina(
+        usuario_telegram_id,
+        estado=estado,
+        excluir_estado=excluir_estado,
+        contacto_id=contacto_id,
+        proyecto_id=proyecto_id,
+        fecha_desde=fecha_desde,
+        fecha_hasta=fecha_hasta,
+        limit=MAX_PAGE_SIZE,
+        fields=fields
+    )["items"]
+
+
+def get_tareas_pagina(
+    usuario_telegram_id: int, 
+    estado: str = None, 
+    contacto_id: int = None,
+    proyecto_id: int = None,
+    fecha_desde: datetime = None,
+    fecha_hasta: datetime = None,
+    limit: int = None,
+    cursor: str = None,
+    fields: str = None,
+    excluir_estado: str = None
+) -> Dict:
+    """Página de tareas ordenada por (fecha_vencimiento, id)."""
+    db = get_supabase()
+    query = db.table("tareas").select(proyeccion("tareas", fields, ("id", "fecha_vencimiento")))\
         .eq("usuario_telegram_id", usuario_telegram_id)
     
     if estado:
         query = query.eq("estado", estado)
+    if excluir_estado:
+        query = query.neq("estado", excluir_estado)
     if contacto_id:
         query = query.eq("contacto_id", contacto_id)
     if proyecto_id:
@@ -235,27 +477,62 @@ def get_tareas(
     if fecha_hasta:
         query = query.lte("fecha_vencimiento", fecha_hasta.isoformat())
     
-    resp = query.order("fecha_vencimiento").execute()
-    return resp.data or []
+    return paginar(query, "fecha_vencimiento", limit, cursor)
+
+
+def get_kanban_columna(
+    usuario_telegram_id: int,
+    estado: str,
+    limit: int = None,
+    cursor: str = None,
+    fields: str = None
+) -> Dict:
+    """
+    Página de una columna del Kanban con el total de tareas en ese estado.
+    Las completadas se ordenan por updated_at descendente (las más
+    recientes primero) para no recorrer todo el historial.
+    """
+    columna = "updated_at" if estado == "completado" else "fecha_vencimiento"
+    
+    db = get_supabase()
+    query = db.table("tareas")\
+        .select(proyeccion("tareas", fields, ("id", columna)), count="exact")\
+        .eq("usuario_telegram_id", usuario_telegram_id)\
+        .eq("estado", estado)
+    
+    return paginar(query, columna, limit or KANBAN_PAGE_SIZE, cursor, desc=(estado == "completado"))
+
+
+def get_tareas_pendientes_hoy(usuario_telegram_id: int, fields: str = None) -> List[Dict]:
+    """Obtiene tareas pendientes para hoy (hasta MAX_PAGE_SIZE)."""
+    return get_tareas_hoy_pagina(usuario_telegram_id, limit=MAX_PAGE_SIZE, fields=fields)["items"]
 
 
-def get_tareas_pendientes_hoy(usuario_telegram_id: int) -> List[Dict]:
-    """Obtiene tareas pendientes para hoy."""
+def get_tareas_hoy_pagina(
+    usuario_telegram_id: int,
+    limit: int = None,
+    cursor: str = None,
+    fields: str = None
+) -> Dict:
+    """Página de las tareas que vencen hoy, ordenada por (fecha_vencimiento, id)."""
     now = datetime.now(TZ)
     inicio_dia = now.replace(hour=0, minute=0, second=0, microsecond=0)
     fin_dia = now.replace(hour=23, minute=59, second=59, microsecond=999999)
     
-    return get_tareas(
+    return get_tareas_pagina(
         usuario_telegram_id,
         fecha_desde=inicio_dia,
-        fecha_hasta=fin_dia
+        fecha_hasta=fin_dia,
+        limit=limit,
+        cursor=cursor,
+        fields=fields
     )
 
 
 def get_tarea(tarea_id: int, usuario_telegram_id: int) -> Optional[Dict]:
     """Obtiene una tarea por ID."""
     db = get_supabase()
-    resp = db.table("tareas").select("*, contactos(id, nombre, email), proyectos(id, nombre)")\
+    resp = db.table("tareas").select(proyeccion("tareas"))\
         .eq("id", tarea_id)\
         .eq("usuario_telegram_id", usuario_telegram_id)\
         .execute()
@@ -290,30 +567,59 @@ def cambiar_estado_tarea(tarea_id: int, usuario_telegram_id: int, nuevo_estado:
 # =============================================
 # RECORDATORIOS CONFIG
 # =============================================
-def get_recordatorios_config(tarea_id: int) -> List[Dict]:
-    """Obtiene configuración de recordatorios de una tarea."""
+def get_recordatorios_config(tarea_id: int, usuario_telegram_id: int) -> List[Dict]:
+    """
+    Obtiene configuración de recordatorios de una tarea del usuario.
+    La pertenencia se filtra en la misma consulta (inner join con tareas):
+    una tarea ajena o inexistente devuelve lista vacía.
+    """
     db = get_supabase()
-    resp = db.table("recordatorios_config").select("*")\
+    resp = db.table("recordatorios_config").select("*, tareas!inner(usuario_telegram_id)")\
         .eq("tarea_id", tarea_id)\
+        .eq("tareas.usuario_telegram_id", usuario_telegram_id)\
         .eq("activo", True)\
         .order("dias_antes", desc=True)\
         .execute()
-    return resp.data or []
+    
+    recordatorios = resp.data or []
+    for rec in recordatorios:
+        rec.pop("tareas", None)
+    return recordatorios
 
 
-def create_recordatorio_config(tarea_id: int, data: Dict) -> Dict:
-    """Crea un nuevo recordatorio para una tarea."""
+def create_recordatorio_config(tarea_id: int, data: Dict, usuario_telegram_id: int = None) -> Optional[Dict]:
+    """
+    Crea un nuevo recordatorio para una tarea.
+    Con usuario_telegram_id, el INSERT solo ocurre si la tarea es del
+    usuario (RPC, un round-trip); si no, devuelve None.
+    """
     db = get_supabase()
-    data["tarea_id"] = tarea_id
-    resp = db.table("recordatorios_config").insert(data).execute()
+    
+    if usuario_telegram_id is None:
+        data["tarea_id"] = tarea_id
+        resp = db.table("recordatorios_config").insert(data).execute()
+        return resp.data[0] if resp.data else None
+    
+    resp = db.rpc("crear_recordatorio_config", {
+        "p_usuario": usuario_telegram_id,
+        "p_tarea": tarea_id,
+        "p_dias_antes": data.get("dias_antes", 0),
+        "p_hora": data.get("hora", "09:00"),
+        "p_canal": data.get("canal", "telegram"),
+        "p_activo": data.get("activo", True)
+    }).execute()
     return resp.data[0] if resp.data else None
 
 
-def delete_recordatorio_config(recordatorio_id: int) -> bool:
-    """Elimina un recordatorio config."""
+def delete_recordatorio_config(recordatorio_id: int, tarea_id: int, usuario_telegram_id: int) -> bool:
+    """Elimina un recordatorio config si la tarea pertenece al usuario (RPC)."""
     db = get_supabase()
-    resp = db.table("recordatorios_config").delete().eq("id", recordatorio_id).execute()
-    return len(resp.data) > 0 if resp.data else False
+    resp = db.rpc("eliminar_recordatorio_config", {
+        "p_usuario": usuario_telegram_id,
+        "p_tarea": tarea_id,
+        "p_recordatorio": recordatorio_id
+    }).execute()
+    return bool(resp.data)
 
 
 # =============================================
@@ -326,18 +632,31 @@ def log_recordatorio_enviado(data: Dict) -> Dict:
     return resp.data[0] if resp.data else None
 
 
+def log_recordatorios_enviados_bulk(rows: List[Dict]):
+    """Registra varios recordatorios enviados en un solo INSERT."""
+    db = get_supabase()
+    db.table("recordatorios_enviados").insert(rows).execute()
+
+
 def get_recordatorios_enviados(usuario_telegram_id: int, limit: int = 50) -> List[Dict]:
-    """Obtiene historial de recordatorios enviados."""
+    """Obtiene historial de recordatorios enviados (los más recientes)."""
+    return get_recordatorios_enviados_pagina(usuario_telegram_id, limit=limit)["items"]
+
+
+def get_recordatorios_enviados_pagina(
+    usuario_telegram_id: int,
+    limit: int = None,
+    cursor: str = None
+) -> Dict:
+    """
+    Página del log de envíos de un usuario, ordenada por (fecha_envio, id)
+    descendente. Filtra por la columna usuario_telegram_id (índice compuesto).
+    """
     db = get_supabase()
-    resp = db.table("recordatorios_enviados")\
-        .select("*, tareas(id, titulo, usuario_telegram_id)")\
-        .order("fecha_envio", desc=True)\
-        .limit(limit)\
-        .execute()
-    
-    # Filtrar por usuario (no hay FK directa)
-    return [r for r in (resp.data or []) 
-            if r.get("tareas", {}).get("usuario_telegram_id") == usuario_telegram_id]
+    query = db.table("recordatorios_enviados")\
+        .select("*, tareas(id, titulo)")\
+        .eq("usuario_telegram_id", usuario_telegram_id)
+    return paginar(query, "fecha_envio", limit, cursor, desc=True)
 
 
 # =============================================
@@ -348,25 +667,37 @@ def create_plantilla(usuario_telegram_id: int, data: Dict) -> Dict:
     db = get_supabase()
     data["usuario_telegram_id"] = usuario_telegram_id
     resp = db.table("plantillas").insert(data).execute()
+    invalidate_plantillas_cache(usuario_telegram_id)
     return resp.data[0] if resp.data else None
 
 
-def get_plantillas(usuario_telegram_id: int, tipo: str = None) -> List[Dict]:
-    """Lista plantillas de un usuario."""
+def get_plantillas(usuario_telegram_id: int, tipo: str = None, fields: str = None) -> List[Dict]:
+    """Lista plantillas de un usuario (hasta MAX_PAGE_SIZE)."""
+    return get_plantillas_pagina(usuario_telegram_id, tipo, limit=MAX_PAGE_SIZE, fields=fields)["items"]
+
+
+def get_plantillas_pagina(
+    usuario_telegram_id: int,
+    tipo: str = None,
+    limit: int = None,
+    cursor: str = None,
+    fields: str = None
+) -> Dict:
+    """Página de plantillas ordenada por (nombre, id)."""
     db = get_supabase()
-    query = db.table("plantillas").select("*").eq("usuario_telegram_id", usuario_telegram_id)
+    query = db.table("plantillas").select(proyeccion("plantillas", fields, ("id", "nombre")))\
+        .eq("usuario_telegram_id", usuario_telegram_id)
     
     if tipo:
         query = query.eq("tipo", tipo)
     
-    resp = query.order("nombre").execute()
-    return resp.data or []
+    return paginar(query, "nombre", limit, cursor)
 
 
 def get_plantilla(plantilla_id: int, usuario_telegram_id: int) -> Optional[Dict]:
     """Obtiene una plantilla por ID."""
     db = get_supabase()
-    resp = db.table("plantillas").select("*")\
+    resp = db.table("plantillas").select(proyeccion("plantillas"))\
         .eq("id", plantilla_id)\
         .eq("usuario_telegram_id", usuario_telegram_id)\
         .execute()
@@ -374,14 +705,75 @@ def get_plantilla(plantilla_id: int, usuario_telegram_id: int) -> Optional[Dict]
 
 
 def get_plantilla_default(usuario_telegram_id: int, tipo: str) -> Optional[Dict]:
-    """Obtiene la plantilla por defecto de un tipo."""
+    """Obtiene la plantilla por defecto de un tipo (con caché en memoria)."""
+    encontrada, plantilla = _get_plantilla_cache(usuario_telegram_id, tipo)
+    if encontrada:
+        return plantilla
+    
     db = get_supabase()
-    resp = db.table("plantillas").select("*")\
+    resp = db.table("plantillas").select(proyeccion("plantillas"))\
         .eq("usuario_telegram_id", usuario_telegram_id)\
         .eq("tipo", tipo)\
         .eq("es_default", True)\
         .execute()
-    return resp.data[0] if resp.data else None
+    plantilla = resp.data[0] if resp.data else None
+    _set_plantilla_cache(usuario_telegram_id, tipo, plantilla)
+    return plantilla
+
+
+def prefetch_plantillas_default(usuario_telegram_ids: Iterable[int], tipos: Tuple[str, ...] = ("telegram", "email")):
+    """
+    Carga en una sola consulta las plantillas por defecto de varios usuarios.
+    Usado por el scheduler antes de despachar un lote de recordatorios.
+    """
+    faltantes = [
+        uid for uid in set(usuario_telegram_ids)
+        if not all(_get_plantilla_cache(uid, tipo)[0] for tipo in tipos)
+    ]
+    if not faltantes:
+        return
+    
+    db = get_supabase()
+    resp = db.table("plantillas").select(proyeccion("plantillas"))\
+        .in_("usuario_telegram_id", faltantes)\
+        .in_("tipo", list(tipos))\
+        .eq("es_default", True)\
+        .execute()
+    
+    encontradas = {}
+    for plantilla in (resp.data or []):
+        encontradas.setdefault((plantilla["usuario_telegram_id"], plantilla["tipo"]), plantilla)
+    
+    # También se cachean las ausencias para no volver a consultarlas
+    for uid in faltantes:
+        for tipo in tipos:
+            _set_plantilla_cache(uid, tipo, encontradas.get((uid, tipo)))
+
+
+# Caché en memoria: (usuario, tipo) -> (expira_en, plantilla | None)
+_plantillas_cache: Dict[Tuple[int, str], Tuple[float, Optional[Dict]]] = {}
+_plantillas_cache_lock = threading.Lock()
+
+
+def _get_plantilla_cache(usuario_telegram_id: int, tipo: str) -> Tuple[bool, Optional[Dict]]:
+    """Devuelve (encontrada, plantilla) si hay una entrada vigente."""
+    with _plantillas_cache_lock:
+        entrada = _plantillas_cache.get((usuario_telegram_id, tipo))
+    if entrada and entrada[0] > monotonic():
+        return True, entrada[1]
+    return False, None
+
+
+def _set_plantilla_cache(usuario_telegram_id: int, tipo: str, plantilla: Optional[Dict]):
+    with _plantillas_cache_lock:
+        _plantillas_cache[(usuario_telegram_id, tipo)] = (monotonic() + PLANTILLA_CACHE_TTL, plantilla)
+
+
+def invalidate_plantillas_cache(usuario_telegram_id: int):
+    """Invalida las plantillas cacheadas de un usuario (tras crear/editar/borrar)."""
+    with _plantillas_cache_lock:
+        for key in [k for k in _plantillas_cache if k[0] == usuario_telegram_id]:
+            del _plantillas_cache[key]
 
 
 def update_plantilla(plantilla_id: int, usuario_telegram_id: int, data: Dict) -> Optional[Dict]:
@@ -391,6 +783,7 @@ def update_plantilla(plantilla_id: int, usuario_telegram_id: int, data: Dict) ->
         .eq("id", plantilla_id)\
         .eq("usuario_telegram_id", usuario_telegram_id)\
         .execute()
+    invalidate_plantillas_cache(usuario_telegram_id)
     return resp.data[0] if resp.data else None
 
 
@@ -401,40 +794,32 @@ def delete_plantilla(plantilla_id: int, usuario_telegram_id: int) -> bool:
         .eq("id", plantilla_id)\
         .eq("usuario_telegram_id", usuario_telegram_id)\
         .execute()
+    invalidate_plantillas_cache(usuario_telegram_id)
     return len(resp.data) > 0 if resp.data else False
 
 
-def create_default_plantillas(usuario_telegram_id: int):
-    """Crea plantillas por defecto para un nuevo usuario."""
-    db = get_supabase()
-    
-    plantillas_default = [
-        {
-            "usuario_telegram_id": usuario_telegram_id,
-            "nombre": "Recordatorio Telegram",
-            "tipo": "telegram",
-            "mensaje": "⏰ *Recordatorio*\n\n📋 *Tarea:* {{titulo}}\n👤 *Contacto:* {{contacto_nombre}}\n📅 *Vencimiento:* {{fecha_vencimiento}}\n\n{{descripcion}}",
-            "es_default": True
-        },
-        {
-            "usuario_telegram_id": usuario_telegram_id,
-            "nombre": "Recordatorio Email",
-            "tipo": "email",
-            "asunto": "Recordatorio: {{titulo}}",
-            "mensaje": "Hola,\n\nEste es un recordatorio sobre la tarea:\n\n📋 Tarea: {{titulo}}\n👤 Contacto: {{contacto_nombre}}\n📅 Vencimiento: {{fecha_vencimiento}}\n\n{{descripcion}}\n\nSaludos,\nCRM Bot",
-            "es_default": True
-        },
-        {
-            "usuario_telegram_id": usuario_telegram_id,
-            "nombre": "Follow-up Telegram",
-            "tipo": "telegram",
-            "mensaje": "📞 *Seguimiento Pendiente*\n\n👤 *Contacto:* {{contacto_nombre}}\n🏢 *Empresa:* {{contacto_empresa}}\n📋 *Asunto:* {{titulo}}\n\nRecuerda hacer follow-up!",
-            "es_default": False
-        }
-    ]
-    
-    for plantilla in plantillas_default:
-        db.table("plantillas").insert(plantilla).execute()
+# Plantillas que recibe cada usuario nuevo
+PLANTILLAS_DEFAULT = [
+    {
+        "nombre": "Recordatorio Telegram",
+        "tipo": "telegram",
+        "mensaje": "⏰ *Recordatorio*\n\n📋 *Tarea:* {{titulo}}\n👤 *Contacto:* {{contacto_nombre}}\n📅 *Vencimiento:* {{fecha_vencimiento}}\n\n{{descripcion}}",
+        "es_default": True
+    },
+    {
+        "nombre": "Recordatorio Email",
+        "tipo": "email",
+        "asunto": "Recordatorio: {{titulo}}",
+        "mensaje": "Hola,\n\nEste es un recordatorio sobre la tarea:\n\n📋 Tarea: {{titulo}}\n👤 Contacto: {{contacto_nombre}}\n📅 Vencimiento: {{fecha_vencimiento}}\n\n{{descripcion}}\n\nSaludos,\nCRM Bot",
+        "es_default": True
+    },
+    {
+        "nombre": "Follow-up Telegram",
+        "tipo": "telegram",
+        "mensaje": "📞 *Seguimiento Pendiente*\n\n👤 *Contacto:* {{contacto_nombre}}\n🏢 *Empresa:* {{contacto_empresa}}\n📋 *Asunto:* {{titulo}}\n\nRecuerda hacer follow-up!",
+        "es_default": False
+    }
+]
 
 
 # =============================================
@@ -448,11 +833,18 @@ def log_interaccion(usuario_telegram_id: int, data: Dict) -> Dict:
     return resp.data[0] if resp.data else None
 
 
-def get_historial_contacto(contacto_id: int, limit: int = 20) -> List[Dict]:
-    """Obtiene historial de un contacto."""
+def log_interacciones_bulk(rows: List[Dict]):
+    """Registra varias interacciones (con usuario_telegram_id) en un solo INSERT."""
+    db = get_supabase()
+    db.table("historial_interacciones").insert(rows).execute()
+
+
+def get_historial_contacto(contacto_id: int, usuario_telegram_id: int, limit: int = 20) -> List[Dict]:
+    """Obtiene historial de un contacto del usuario (filtrado en la misma consulta)."""
     db = get_supabase()
-    resp = db.table("historial_interacciones").select("*")\
+    resp = db.table("historial_interacciones").select(proyeccion("historial_interacciones"))\
         .eq("contacto_id", contacto_id)\
+        .eq("usuario_telegram_id", usuario_telegram_id)\
         .order("created_at", desc=True)\
         .limit(limit)\
         .execute()
@@ -463,117 +855,133 @@ def get_historial_contacto(contacto_id: int, limit: int = 20) -> List[Dict]:
 # DASHBOARD / ESTADÍSTICAS
 # =============================================
 def get_dashboard_stats(usuario_telegram_id: int) -> Dict:
-    """Obtiene estadísticas para el dashboard."""
+    """
+    Obtiene estadísticas para el dashboard.
+    Todo se agrega en la función SQL dashboard_stats: un único round-trip
+    que lee los contadores de usuario_contadores (mantenidos por triggers).
+    """
     db = get_supabase()
     now = datetime.now(TZ)
     inicio_dia = now.replace(hour=0, minute=0, second=0, microsecond=0)
     fin_dia = now.replace(hour=23, minute=59, second=59, microsecond=999999)
     
-    # Total contactos
-    contactos = db.table("contactos").select("id", count="exact")\
-        .eq("usuario_telegram_id", usuario_telegram_id).execute()
-    
-    # Tareas por estado
-    tareas = db.table("tareas").select("estado")\
-        .eq("usuario_telegram_id", usuario_telegram_id)\
-        .neq("estado", "completado").execute()
-    
-    tareas_por_estado = {}
-    for t in (tareas.data or []):
-        estado = t["estado"]
-        tareas_por_estado[estado] = tareas_por_estado.get(estado, 0) + 1
-    
-    # Tareas hoy
-    tareas_hoy = db.table("tareas").select("id", count="exact")\
-        .eq("usuario_telegram_id", usuario_telegram_id)\
-        .gte("fecha_vencimiento", inicio_dia.isoformat())\
-        .lte("fecha_vencimiento", fin_dia.isoformat()).execute()
-    
-    # Proyectos activos
-    proyectos = db.table("proyectos").select("id", count="exact")\
-        .eq("usuario_telegram_id", usuario_telegram_id)\
-        .eq("estado", "activo").execute()
-    
-    # Próximos vencimientos (7 días)
-    proximos = db.table("tareas").select("*, contactos(nombre)")\
-        .eq("usuario_telegram_id", usuario_telegram_id)\
-        .neq("estado", "completado")\
-        .gte("fecha_vencimiento", now.isoformat())\
-        .lte("fecha_vencimiento", (now + timedelta(days=7)).isoformat())\
-        .order("fecha_vencimiento")\
-        .limit(10).execute()
+    inicio = monotonic()
+    resp = db.rpc("dashboard_stats", {
+        "p_usuario": usuario_telegram_id,
+        "p_inicio_dia": inicio_dia.isoformat(),
+        "p_fin_dia": fin_dia.isoformat(),
+        "p_ahora": now.isoformat()
+    }).execute()
+    logger.debug(f"📊 dashboard_stats({usuario_telegram_id}): {(monotonic() - inicio) * 1000:.1f} ms")
     
+    stats = resp.data or {}
     return {
-        "total_contactos": contactos.count or 0,
-        "total_tareas_pendientes": len(tareas.data or []),
-        "total_tareas_hoy": tareas_hoy.count or 0,
-        "total_proyectos_activos": proyectos.count or 0,
-        "tareas_por_estado": tareas_por_estado,
-        "proximos_vencimientos": proximos.data or []
+        "total_contactos": stats.get("total_contactos", 0),
+        "total_tareas_pendientes": stats.get("total_tareas_pendientes", 0),
+        "total_tareas_hoy": stats.get("total_tareas_hoy", 0),
+        "total_proyectos_activos": stats.get("total_proyectos_activos", 0),
+        "tareas_por_estado": stats.get("tareas_por_estado") or {},
+        "proximos_vencimientos": stats.get("proximos_vencimientos") or []
     }
 
 
+def buscar_global(
+    usuario_telegram_id: int,
+    consulta: str,
+    limit: int = None,
+    offset: int = 0,
+    tipos: List[str] = None
+) -> Dict:
+    """
+    Búsqueda de texto completo en tareas, proyectos, plantillas e historial.
+    Devuelve {entidad: {"total", "items"}} con fragmentos resaltados.
+    """
+    db = get_supabase()
+    resp = db.rpc("buscar_global", {
+        "p_usuario": usuario_telegram_id,
+        "p_consulta": consulta,
+        "p_limite": max(1, min(limit or SEARCH_LIMIT, MAX_PAGE_SIZE)),
+        "p_offset": max(0, offset),
+        "p_tipos": tipos or None
+    }).execute()
+    return resp.data or {}
+
+
+def reconciliar_contadores() -> int:
+    """
+    Recalcula usuario_contadores contra las tablas reales.
+    Devuelve la cantidad de contadores corregidos (drift detectado).
+    """
+    db = get_supabase()
+    resp = db.rpc("reconciliar_contadores", {}).execute()
+    return resp.data or 0
+
+
 # =============================================
 # RECORDATORIOS - PARA SCHEDULER
 # =============================================
 def get_recordatorios_pendientes() -> List[Dict]:
     """
     Obtiene recordatorios que deben enviarse.
-    Busca tareas activas cuyos recordatorios configurados coinciden con hoy.
+    Lee solo los recordatorios cuyo next_fire_at (precalculado en la BD)
+    cae entre el inicio del día y ahora, usando idx_recordatorios_config_next_fire.
+    Los devueltos ya quedan reclamados para hoy: el llamador debe enviarlos.
     """
     db = get_supabase()
     now = datetime.now(TZ)
     hoy = now.date()
+    inicio_dia = now.replace(hour=0, minute=0, second=0, microsecond=0)
     
-    # Obtener todas las tareas activas con fecha de vencimiento
     # Nota: usuarios.email se usa para Reply-To y CC en emails
-    tareas = db.table("tareas")\
-        .select("*, contactos(id, nombre, email, telegram_id), usuarios(telegram_id, email), recordatorios_config(*)")\
-        .neq("estado", "completado")\
-        .not_.is_("fecha_vencimiento", "null")\
+    configs = db.table("recordatorios_config")\
+        .select("*, tareas!inner(*, contactos(id, nombre, email, telegram_id), usuarios(telegram_id, email))")\
+        .eq("activo", True)\
+        .gte("next_fire_at", inicio_dia.isoformat())\
+        .lte("next_fire_at", now.isoformat())\
+        .neq("tareas.estado", "completado")\
+        .order("next_fire_at")\
         .execute()
     
+    candidatos = configs.data or []
+    if not candidatos:
+        return []
+    
+    # Reclamar todos los disparos de hoy en una sola llamada
+    reclamados = claim_recordatorios_disparos([c["id"] for c in candidatos], hoy)
+    
     pendientes = []
     
-    for tarea in (tareas.data or []):
-        if not tarea.get("recordatorios_config"):
+    for rec_config in candidatos:
+        if rec_config["id"] not in reclamados:
             continue
         
-        fecha_vencimiento = datetime.fromisoformat(tarea["fecha_vencimiento"].replace("Z", "+00:00"))
-        if fecha_vencimiento.tzinfo is None:
-            fecha_vencimiento = TZ.localize(fecha_vencimiento)
-        
-        for rec_config in tarea["recordatorios_config"]:
-            if not rec_config.get("activo"):
-                continue
-            
-            # Calcular fecha del recordatorio
-            dias_antes = rec_config.get("dias_antes", 0)
-            fecha_recordatorio = (fecha_vencimiento - timedelta(days=dias_antes)).date()
-            
-            # Si es hoy
-            if fecha_recordatorio == hoy:
-                hora_rec = rec_config.get("hora", "09:00")
-                if isinstance(hora_rec, str):
-                    hora_rec = datetime.strptime(hora_rec, "%H:%M:%S").time()
-                
-                # Verificar si ya pasó la hora (o estamos cerca)
-                rec_datetime = TZ.localize(datetime.combine(hoy, hora_rec))
-                
-                if now >= rec_datetime:
-                    # Verificar que no se haya enviado ya hoy
-                    ya_enviado = db.table("recordatorios_enviados")\
-                        .select("id")\
-                        .eq("recordatorio_config_id", rec_config["id"])\
-                        .gte("fecha_envio", datetime.combine(hoy, time.min).isoformat())\
-                        .execute()
-                    
-                    if not ya_enviado.data:
-                        pendientes.append({
-                            "tarea": tarea,
-                            "recordatorio_config": rec_config,
-                            "usuario": tarea.get("usuarios"),
-                            "contacto": tarea.get("contactos")
-                        })
+        tarea = rec_config.pop("tareas")
+        pendientes.append({
+            "tarea": tarea,
+            "recordatorio_config": rec_config,
+            "usuario": tarea.get("usuarios"),
+            "contacto": tarea.get("contactos")
+        })
     
     return pendientes
+
+
+def claim_recordatorios_disparos(config_ids: List[int], fecha: date) -> set:
+    """
+    Reclama atómicamente el disparo del día de varios recordatorios.
+    Inserta (config_id, fecha) con ON CONFLICT DO NOTHING: la respuesta
+    solo trae las filas nuevas, así que cada recordatorio lo envía un único
+    proceso aunque haya varios schedulers corriendo.
+    """
+    if not config_ids:
+        return set()
+    
+    db = get_supabase()
+    rows = [
+        {"recordatorio_config_id": config_id, "fecha_disparo": fecha.isoformat()}
+        for config_id in config_ids
+    ]
+    resp = db.table("recordatorios_disparos")\
+        .upsert(rows, on_conflict="recordatorio_config_id,fecha_disparo", ignore_duplicates=True)\
+        .execute()
+    return {r["recordatorio_config_id"] for r in (resp.data or [])}
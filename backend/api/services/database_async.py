@@ -0,0 +1,138 @@
+"""
+Servicio de Base de Datos Asíncrono
+===================================
+Expone las funciones de database.py como corutinas.
+El cliente de Supabase es síncrono, así que cada llamada corre en un
+pool de hilos acotado y el event loop de FastAPI nunca se bloquea.
+"""
+import os
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Callable, Any
+
+from dotenv import load_dotenv
+
+from . import database
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Máximo de consultas simultáneas a Supabase por proceso
+DB_MAX_WORKERS = int(os.getenv("DB_MAX_WORKERS", "16"))
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Obtiene el pool de hilos de la base de datos (singleton)."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=DB_MAX_WORKERS,
+            thread_name_prefix="db"
+        )
+    return _executor
+
+
+def shutdown_executor():
+    """Cierra el pool de hilos esperando las consultas en curso."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+        logger.info("🗄 Pool de base de datos cerrado")
+
+
+async def run_db(func: Callable, *args, **kwargs) -> Any:
+    """Ejecuta una función síncrona de database.py en el pool acotado."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_executor(),
+        functools.partial(func, *args, **kwargs)
+    )
+
+
+def _async(func: Callable) -> Callable:
+    """Envuelve una función de database.py conservando nombre y docstring."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_db(func, *args, **kwargs)
+    return wrapper
+
+
+# =============================================
+# USUARIOS
+# =============================================
+get_or_create_usuario = _async(database.get_or_create_usuario)
+update_usuario = _async(database.update_usuario)
+get_usuario = _async(database.get_usuario)
+
+# =============================================
+# CONTACTOS
+# =============================================
+create_contacto = _async(database.create_contacto)
+get_contactos = _async(database.get_contactos)
+get_contactos_pagina = _async(database.get_contactos_pagina)
+buscar_contactos = _async(database.buscar_contactos)
+get_contacto = _async(database.get_contacto)
+update_contacto = _async(database.update_contacto)
+delete_contacto = _async(database.delete_contacto)
+
+# =============================================
+# PROYECTOS
+# =============================================
+create_proyecto = _async(database.create_proyecto)
+get_proyectos = _async(database.get_proyectos)
+get_proyectos_pagina = _async(database.get_proyectos_pagina)
+get_proyecto = _async(database.get_proyecto)
+update_proyecto = _async(database.update_proyecto)
+delete_proyecto = _async(database.delete_proyecto)
+
+# =============================================
+# TAREAS
+# =============================================
+create_tarea = _async(database.create_tarea)
+get_tareas = _async(database.get_tareas)
+get_tareas_pagina = _async(database.get_tareas_pagina)
+get_kanban_columna = _async(database.get_kanban_columna)
+get_tareas_pendientes_hoy = _async(database.get_tareas_pendientes_hoy)
+get_tareas_hoy_pagina = _async(database.get_tareas_hoy_pagina)
+get_tarea = _async(database.get_tarea)
+update_tarea = _async(database.update_tarea)
+delete_tarea = _async(database.delete_tarea)
+cambiar_estado_tarea = _async(database.cambiar_estado_tarea)
+
+# =============================================
+# RECORDATORIOS
+# =============================================
+get_recordatorios_config = _async(database.get_recordatorios_config)
+create_recordatorio_config = _async(database.create_recordatorio_config)
+delete_recordatorio_config = _async(database.delete_recordatorio_config)
+log_recordatorio_enviado = _async(database.log_recordatorio_enviado)
+get_recordatorios_enviados = _async(database.get_recordatorios_enviados)
+get_recordatorios_enviados_pagina = _async(database.get_recordatorios_enviados_pagina)
+get_recordatorios_pendientes = _async(database.get_recordatorios_pendientes)
+
+# =============================================
+# PLANTILLAS
+# =============================================
+create_plantilla = _async(database.create_plantilla)
+get_plantillas = _async(database.get_plantillas)
+get_plantillas_pagina = _async(database.get_plantillas_pagina)
+get_plantilla = _async(database.get_plantilla)
+get_plantilla_default = _async(database.get_plantilla_default)
+prefetch_plantillas_default = _async(database.prefetch_plantillas_default)
+update_plantilla = _async(database.update_plantilla)
+delete_plantilla = _async(database.delete_plantilla)
+
+# =============================================
+# HISTORIAL / DASHBOARD
+# =============================================
+log_interaccion = _async(database.log_interaccion)
+get_historial_contacto = _async(database.get_historial_contacto)
+get_dashboard_stats = _async(database.get_dashboard_stats)
+buscar_global = _async(database.buscar_global)
+reconciliar_contadores = _async(database.reconciliar_contadores)
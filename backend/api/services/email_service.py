@@ -5,16 +5,18 @@ Todos los emails salen del dominio del CRM.
 El email del usuario va en Reply-To y CC para recibir respuestas.
 """
 import os
+import time
 import logging
-import smtplib
 import asyncio
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from typing import Optional, Dict, Any, List
-import re
+from typing import Optional, Dict, Any, List, Tuple
 
+import aiosmtplib
 from dotenv import load_dotenv
 
+from . import template_engine
+
 load_dotenv()
 
 logger = logging.getLogger(__name__)
@@ -28,25 +30,209 @@ SMTP_USER = os.getenv("SMTP_USER")  # noreply@tudominio.com
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
 SMTP_FROM_NAME = os.getenv("SMTP_FROM_NAME", "CRM Follow-Up")
 SMTP_USE_SSL = os.getenv("SMTP_USE_SSL", "true").lower() == "true"
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
+
+# Pool de conexiones SMTP
+SMTP_IDLE_TIMEOUT = float(os.getenv("SMTP_IDLE_TIMEOUT", "60"))         # segundos sin uso antes de cerrar
+SMTP_MAX_MESSAGES_PER_CONNECTION = int(os.getenv("SMTP_MAX_MESSAGES_PER_CONNECTION", "100"))
+SMTP_ASYNC_CONCURRENCY = int(os.getenv("SMTP_ASYNC_CONCURRENCY", "10"))  # sesiones del pool asíncrono
+SMTP_HEALTHCHECK_AFTER = 5.0  # segundos de inactividad tras los que se hace NOOP
+
+
+# =============================================
+# POOL DE SESIONES SMTP
+# =============================================
+class _SMTPSession:
+    """Sesión SMTP autenticada con sus métricas de uso."""
+
+    def __init__(self, server: aiosmtplib.SMTP):
+        self.server = server
+        self.last_used = time.monotonic()
+        self.sent = 0
+
+
+class AsyncSMTPPool:
+    """
+    Pool asíncrono de sesiones SMTP (aiosmtplib).
+    Cada sesión entrega sus mensajes uno tras otro sobre la misma conexión;
+    el tamaño del pool limita los envíos simultáneos.
+    """
+
+    def __init__(self, size: int, idle_timeout: float, max_messages: int):
+        self.idle_timeout = idle_timeout
+        self.max_messages = max_messages
+        self._slots = asyncio.Semaphore(size)
+        self._idle: List[_SMTPSession] = []
+
+    async def _open(self) -> _SMTPSession:
+        """Abre y autentica una sesión nueva."""
+        server = aiosmtplib.SMTP(
+            hostname=SMTP_HOST,
+            port=SMTP_PORT,
+            use_tls=SMTP_USE_SSL,
+            start_tls=not SMTP_USE_SSL,
+            timeout=SMTP_TIMEOUT
+        )
+        await server.connect()
+        try:
+            await server.login(SMTP_USER, SMTP_PASSWORD)
+        except Exception:
+            server.close()
+            raise
+        logger.debug("📧 Nueva sesión SMTP asíncrona abierta")
+        return _SMTPSession(server)
+
+    @staticmethod
+    async def _close(session: _SMTPSession):
+        """Cierra una sesión ignorando errores de red."""
+        try:
+            await session.server.quit()
+        except Exception:
+            session.server.close()
+
+    async def _is_healthy(self, session: _SMTPSession) -> bool:
+        """Descarta sesiones inactivas, agotadas o que no responden NOOP."""
+        if not session.server.is_connected:
+            return False
+        idle = time.monotonic() - session.last_used
+        if idle > self.idle_timeout or session.sent >= self.max_messages:
+            return False
+        if idle > SMTP_HEALTHCHECK_AFTER:
+            try:
+                return (await session.server.noop()).code == 250
+            except (aiosmtplib.SMTPException, OSError):
+                return False
+        return True
 
+    async def _checkout(self) -> _SMTPSession:
+        """Toma una sesión sana del pool o abre una nueva."""
+        while self._idle:
+            session = self._idle.pop()
+            if await self._is_healthy(session):
+                return session
+            await self._close(session)
+        return await self._open()
 
-def render_template(template: str, variables: Dict[str, Any]) -> str:
+    async def _checkin(self, session: _SMTPSession):
+        """Devuelve la sesión al pool o la cierra si alcanzó su tope de mensajes."""
+        session.last_used = time.monotonic()
+        if session.sent >= self.max_messages:
+            await self._close(session)
+        else:
+            self._idle.append(session)
+
+    async def send_message(self, msg: MIMEMultipart, recipients: List[str]):
+        """Envía un mensaje reutilizando una sesión (reconecta si el servidor la cerró)."""
+        async with self._slots:
+            session = await self._checkout()
+            try:
+                try:
+                    await session.server.send_message(msg, recipients=recipients)
+                except aiosmtplib.SMTPServerDisconnected:
+                    session = await self._open()
+                    await session.server.send_message(msg, recipients=recipients)
+            except BaseException:
+                await self._close(session)
+                raise
+            session.sent += 1
+            await self._checkin(session)
+
+    async def check(self):
+        """Verifica que se puede obtener una sesión autenticada y operativa."""
+        async with self._slots:
+            session = await self._checkout()
+            try:
+                response = await session.server.noop()
+                if response.code != 250:
+                    raise aiosmtplib.SMTPResponseException(response.code, "NOOP rechazado")
+            except BaseException:
+                await self._close(session)
+                raise
+            await self._checkin(session)
+
+    async def close(self):
+        """Cierra todas las sesiones inactivas."""
+        while self._idle:
+            await self._close(self._idle.pop())
+
+
+_async_smtp_pool: Optional[AsyncSMTPPool] = None
+
+
+def get_async_smtp_pool() -> AsyncSMTPPool:
+    """Obtiene el pool SMTP asíncrono (singleton del event loop)."""
+    global _async_smtp_pool
+    if _async_smtp_pool is None:
+        _async_smtp_pool = AsyncSMTPPool(
+            size=SMTP_ASYNC_CONCURRENCY,
+            idle_timeout=SMTP_IDLE_TIMEOUT,
+            max_messages=SMTP_MAX_MESSAGES_PER_CONNECTION
+        )
+    return _async_smtp_pool
+
+
+async def close_async_smtp_pool():
+    """Cierra las sesiones SMTP asíncronas (al apagar la API)."""
+    if _async_smtp_pool is not None:
+        await _async_smtp_pool.close()
+        logger.info("📧 Pool SMTP asíncrono cerrado")
+
+
+def render_template(template: str, variables: Dict[str, Any], template_id: int = None) -> str:
     """
     Renderiza una plantilla reemplazando variables.
-    Variables en formato: {{nombre_variable}}
+    Variables en formato: {{nombre_variable}}; las no definidas quedan vacías.
+    La plantilla se compila una vez y se cachea (ver template_engine).
     """
-    result = template
-    for key, value in variables.items():
-        placeholder = "{{" + key + "}}"
-        result = result.replace(placeholder, str(value) if value else "")
+    return template_engine.render(template, variables, template_id)
+
+
+def render_template_many(
+    template: str,
+    variables_list: List[Dict[str, Any]],
+    template_id: int = None
+) -> List[str]:
+    """Renderiza una plantilla contra muchos dicts de variables."""
+    return template_engine.render_many(template, variables_list, template_id)
+
+
+def build_message(
+    to: str,
+    subject: str,
+    body: str,
+    reply_to: str = None,
+    cc: List[str] = None,
+    is_html: bool = False
+) -> Tuple[MIMEMultipart, List[str]]:
+    """Arma el mensaje MIME y la lista completa de destinatarios."""
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = subject
+    msg['From'] = f"{SMTP_FROM_NAME} <{SMTP_USER}>"
+    msg['To'] = to
+    
+    # Reply-To: el email del usuario del CRM
+    if reply_to:
+        msg['Reply-To'] = reply_to
     
-    # Limpiar variables no reemplazadas
-    result = re.sub(r'\{\{[^}]+\}\}', '', result)
+    # CC: incluir al usuario para que vea los envíos
+    if cc:
+        msg['Cc'] = ', '.join(cc)
     
-    return result
+    # Agregar contenido
+    if is_html:
+        msg.attach(MIMEText(body, 'html', 'utf-8'))
+    else:
+        msg.attach(MIMEText(body, 'plain', 'utf-8'))
+    
+    # Lista completa de destinatarios
+    all_recipients = [to]
+    if cc:
+        all_recipients.extend(cc)
+    
+    return msg, all_recipients
 
 
-def send_email_sync(
+async def send_email(
     to: str,
     subject: str,
     body: str,
@@ -55,7 +241,8 @@ def send_email_sync(
     is_html: bool = False
 ) -> Dict[str, Any]:
     """
-    Envía un email usando el SMTP centralizado del servidor.
+    Envía un email usando el SMTP centralizado del servidor (aiosmtplib).
+    No ocupa hilos del executor: las sesiones se comparten desde AsyncSMTPPool.
     
     Args:
         to: Destinatario principal
@@ -75,46 +262,14 @@ def send_email_sync(
         }
     
     try:
-        # Crear mensaje
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = subject
-        msg['From'] = f"{SMTP_FROM_NAME} <{SMTP_USER}>"
-        msg['To'] = to
-        
-        # Reply-To: el email del usuario del CRM
-        if reply_to:
-            msg['Reply-To'] = reply_to
-        
-        # CC: incluir al usuario para que vea los envíos
-        if cc:
-            msg['Cc'] = ', '.join(cc)
-        
-        # Agregar contenido
-        if is_html:
-            msg.attach(MIMEText(body, 'html', 'utf-8'))
-        else:
-            msg.attach(MIMEText(body, 'plain', 'utf-8'))
+        msg, all_recipients = build_message(to, subject, body, reply_to, cc, is_html)
         
-        # Lista completa de destinatarios
-        all_recipients = [to]
-        if cc:
-            all_recipients.extend(cc)
-        
-        # Enviar
-        if SMTP_USE_SSL:
-            with smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT) as server:
-                server.login(SMTP_USER, SMTP_PASSWORD)
-                server.send_message(msg, to_addrs=all_recipients)
-        else:
-            with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
-                server.starttls()
-                server.login(SMTP_USER, SMTP_PASSWORD)
-                server.send_message(msg, to_addrs=all_recipients)
+        await get_async_smtp_pool().send_message(msg, all_recipients)
         
         logger.info(f"📧 Email enviado a {to} (reply-to: {reply_to}, cc: {cc})")
         return {"success": True, "message": f"Email enviado a {to}"}
     
-    except smtplib.SMTPAuthenticationError:
+    except aiosmtplib.SMTPAuthenticationError:
         error_msg = "Error de autenticación SMTP. Verificar credenciales del servidor."
         logger.error(f"❌ {error_msg}")
         return {"success": False, "error": error_msg}
@@ -125,23 +280,7 @@ def send_email_sync(
         return {"success": False, "error": error_msg}
 
 
-async def send_email(
-    to: str,
-    subject: str,
-    body: str,
-    reply_to: str = None,
-    cc: List[str] = None,
-    is_html: bool = False
-) -> Dict[str, Any]:
-    """Versión asíncrona de send_email_sync."""
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(
-        None,
-        lambda: send_email_sync(to, subject, body, reply_to, cc, is_html)
-    )
-
-
-def send_reminder_email(
+async def send_reminder_email(
     tarea: Dict,
     contacto: Dict,
     plantilla: Dict,
@@ -176,14 +315,14 @@ def send_reminder_email(
     }
     
     # Renderizar plantilla
-    asunto = render_template(plantilla.get("asunto", "Recordatorio: {{titulo}}"), variables)
-    mensaje = render_template(plantilla.get("mensaje", ""), variables)
+    asunto = render_template(plantilla.get("asunto", "Recordatorio: {{titulo}}"), variables, plantilla.get("id"))
+    mensaje = render_template(plantilla.get("mensaje", ""), variables, plantilla.get("id"))
     
     # Agregar firma automática si el usuario tiene email
     if usuario_email:
         mensaje += f"\n\n---\nPuedes responder directamente a este email."
     
-    return send_email_sync(
+    return await send_email(
         to=contacto["email"],
         subject=asunto,
         body=mensaje,
@@ -192,7 +331,7 @@ def send_reminder_email(
     )
 
 
-def test_smtp_connection() -> Dict[str, Any]:
+async def test_smtp_connection() -> Dict[str, Any]:
     """
     Prueba la conexión SMTP del servidor.
     Útil para verificar configuración.
@@ -201,17 +340,11 @@ def test_smtp_connection() -> Dict[str, Any]:
         return {"success": False, "error": "SMTP no configurado"}
     
     try:
-        if SMTP_USE_SSL:
-            with smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT) as server:
-                server.login(SMTP_USER, SMTP_PASSWORD)
-        else:
-            with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
-                server.starttls()
-                server.login(SMTP_USER, SMTP_PASSWORD)
+        await get_async_smtp_pool().check()
         
         return {"success": True, "message": "Conexión SMTP exitosa"}
     
-    except smtplib.SMTPAuthenticationError:
+    except aiosmtplib.SMTPAuthenticationError:
         return {"success": False, "error": "Credenciales SMTP inválidas"}
     
     except Exception as e:
@@ -0,0 +1,176 @@
+"""
+Log Buffer - Escritura diferida de logs
+=======================================
+Los envíos de recordatorios no esperan a la base de datos para loggear:
+las filas de recordatorios_enviados e historial_interacciones se acumulan
+en memoria y se insertan en bloque cada LOG_BUFFER_MAX_ROWS filas o cada
+LOG_BUFFER_FLUSH_MS milisegundos.
+Si la base no está disponible, las filas se guardan en un archivo JSONL
+local y se reintentan en el siguiente flush exitoso.
+"""
+import os
+import json
+import asyncio
+import logging
+from typing import Dict, List, Optional, Callable
+
+from dotenv import load_dotenv
+
+from . import database
+from .database_async import run_db
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+LOG_BUFFER_MAX_ROWS = int(os.getenv("LOG_BUFFER_MAX_ROWS", "100"))
+LOG_BUFFER_FLUSH_MS = int(os.getenv("LOG_BUFFER_FLUSH_MS", "500"))
+# Respaldo local; una ruta relativa se resuelve desde backend/, no desde el cwd
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+LOG_SPILL_PATH = os.path.join(BACKEND_DIR, os.getenv("LOG_SPILL_PATH", "logs_pendientes.jsonl"))
+
+# Tabla -> función de inserción masiva
+TABLAS: Dict[str, Callable[[List[Dict]], None]] = {
+    "recordatorios_enviados": database.log_recordatorios_enviados_bulk,
+    "historial_interacciones": database.log_interacciones_bulk,
+}
+
+
+class LogBuffer:
+    """Buffer de filas por tabla con flush periódico y por tamaño."""
+
+    def __init__(self, max_rows: int, flush_ms: int, spill_path: str):
+        self.max_rows = max_rows
+        self.flush_interval = flush_ms / 1000
+        self.spill_path = spill_path
+        self._rows: Dict[str, List[Dict]] = {tabla: [] for tabla in TABLAS}
+        self._pending = 0
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._closing = False
+
+    @property
+    def pending(self) -> int:
+        """Filas esperando ser escritas."""
+        return self._pending
+
+    def add(self, tabla: str, row: Dict):
+        """Encola una fila. No bloquea: la escritura ocurre en segundo plano."""
+        if tabla not in TABLAS:
+            raise ValueError(f"Tabla sin buffer: {tabla}")
+
+        self._rows[tabla].append(row)
+        self._pending += 1
+
+        if self._task is None:
+            self._start()
+        if self._pending >= self.max_rows:
+            self._wakeup.set()
+
+    def _start(self):
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Escribe todo lo acumulado (un INSERT por tabla)."""
+        if not self._pending:
+            return
+
+        async with self._flush_lock:
+            lotes = {tabla: rows for tabla, rows in self._rows.items() if rows}
+            self._rows = {tabla: [] for tabla in TABLAS}
+            self._pending = 0
+
+            escritas = True
+            for tabla, rows in lotes.items():
+                try:
+                    await run_db(TABLAS[tabla], rows)
+                except Exception as e:
+                    escritas = False
+                    logger.error(f"❌ Error escribiendo {len(rows)} filas en {tabla}: {e}")
+                    self._spill(tabla, rows)
+
+            if escritas and os.path.exists(self.spill_path):
+                await self._replay_spill()
+
+    def _spill(self, tabla: str, rows: List[Dict]):
+        """Guarda filas no escritas en el archivo local."""
+        try:
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                for row in rows:
+                    f.write(json.dumps({"tabla": tabla, "row": row}, default=str) + "\n")
+            logger.warning(f"💾 {len(rows)} filas de {tabla} guardadas en {self.spill_path}")
+        except OSError as e:
+            logger.error(f"❌ No se pudieron guardar {len(rows)} filas de {tabla}: {e}")
+
+    async def _replay_spill(self):
+        """Reintenta las filas guardadas en disco cuando la base vuelve."""
+        replay_path = self.spill_path + ".replay"
+        try:
+            os.replace(self.spill_path, replay_path)
+            with open(replay_path, encoding="utf-8") as f:
+                lineas = [json.loads(linea) for linea in f if linea.strip()]
+        except (OSError, ValueError) as e:
+            logger.error(f"❌ Error leyendo {self.spill_path}: {e}")
+            return
+
+        lotes: Dict[str, List[Dict]] = {}
+        for linea in lineas:
+            lotes.setdefault(linea["tabla"], []).append(linea["row"])
+
+        for tabla, rows in lotes.items():
+            try:
+                await run_db(TABLAS[tabla], rows)
+                logger.info(f"💾 {len(rows)} filas pendientes de {tabla} recuperadas")
+            except Exception as e:
+                logger.error(f"❌ Error recuperando filas de {tabla}: {e}")
+                self._spill(tabla, rows)
+
+        try:
+            os.remove(replay_path)
+        except OSError:
+            pass
+
+    async def close(self):
+        """Detiene el flush periódico y escribe lo pendiente."""
+        if self._task is None:
+            return
+
+        # El loop termina su flush en curso y sale; luego se escribe el resto
+        self._closing = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+        self._closing = False
+
+        if self._pending:
+            await self.flush()
+        logger.info("💾 Buffer de logs cerrado")
+
+
+_buffer: Optional[LogBuffer] = None
+
+
+def get_log_buffer() -> LogBuffer:
+    """Obtiene el buffer de logs compartido (singleton)."""
+    global _buffer
+    if _buffer is None:
+        _buffer = LogBuffer(LOG_BUFFER_MAX_ROWS, LOG_BUFFER_FLUSH_MS, LOG_SPILL_PATH)
+    return _buffer
+
+
+async def close_log_buffer():
+    """Escribe los logs pendientes. Llamar antes de cerrar el pool de la base."""
+    if _buffer is not None:
+        await _buffer.close()
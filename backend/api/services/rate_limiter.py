@@ -0,0 +1,118 @@
+"""
+Rate Limiter - Límites de la Bot API de Telegram
+================================================
+Token buckets delante de cada envío saliente:
+- Global: ~30 mensajes/s por bot
+- Por chat: ~1 mensaje/s
+Los 429 pausan todos los envíos durante el retry_after indicado por Telegram.
+"""
+import os
+import time
+import asyncio
+import logging
+from typing import Dict, Optional, Hashable
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))    # mensajes/s
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))         # mensajes/s por chat
+TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", "3"))      # reintentos ante 429
+
+# Buckets por chat inactivos que se purgan al superar este tamaño
+_MAX_CHAT_BUCKETS = 10000
+
+
+class TokenBucket:
+    """Bucket de tokens asíncrono: `rate` tokens/s con ráfaga máxima `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def idle(self) -> bool:
+        """True si el bucket está lleno (nadie lo usó recientemente)."""
+        self._refill()
+        return self._tokens >= self.capacity and not self._lock.locked()
+
+    async def acquire(self):
+        """Espera (en orden de llegada) hasta disponer de un token."""
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class TelegramRateLimiter:
+    """
+    Limitador con un bucket global y uno por chat.
+    Expone queue_depth (envíos esperando turno) para monitoreo.
+    """
+
+    def __init__(self, global_rate: float, chat_rate: float):
+        self.chat_rate = chat_rate
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats: Dict[Hashable, TokenBucket] = {}
+        self._paused_until = 0.0
+        self._waiting = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return self._waiting
+
+    def _chat_bucket(self, chat_id: Hashable) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= _MAX_CHAT_BUCKETS:
+                self._chats = {k: b for k, b in self._chats.items() if not b.idle}
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, 1)
+        return bucket
+
+    def pause(self, seconds: float):
+        """Pausa todos los envíos (respuesta 429 con retry_after)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        logger.warning(f"⏸ Telegram 429: pausando envíos {seconds:.0f}s")
+
+    async def _wait_pause(self):
+        while True:
+            remaining = self._paused_until - time.monotonic()
+            if remaining <= 0:
+                return
+            await asyncio.sleep(remaining)
+
+    async def acquire(self, chat_id: Optional[Hashable] = None):
+        """Espera turno para enviar a chat_id (o solo el global si no hay chat)."""
+        self._waiting += 1
+        try:
+            if chat_id is not None:
+                await self._chat_bucket(chat_id).acquire()
+            await self._wait_pause()
+            await self._global.acquire()
+        finally:
+            self._waiting -= 1
+
+
+_limiter: Optional[TelegramRateLimiter] = None
+
+
+def get_rate_limiter() -> TelegramRateLimiter:
+    """Obtiene el limitador compartido por la API, el scheduler y el bot."""
+    global _limiter
+    if _limiter is None:
+        _limiter = TelegramRateLimiter(TELEGRAM_GLOBAL_RATE, TELEGRAM_CHAT_RATE)
+    return _limiter
@@ -4,6 +4,8 @@ Scheduler - Servicio de automatización y cron jobs (SaaS)
 Procesa recordatorios usando SMTP centralizado.
 El email del usuario va en Reply-To y CC.
 """
+import os
+import asyncio
 import logging
 from datetime import datetime, timedelta, time
 from typing import Dict, Any, List
@@ -11,23 +13,53 @@ from typing import Dict, Any, List
 import pytz
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
+from dotenv import load_dotenv
 
-from .database import (
+from .database_async import (
     get_recordatorios_pendientes,
-    log_recordatorio_enviado,
     get_plantilla_default,
+    prefetch_plantillas_default,
     update_tarea,
-    log_interaccion,
-    get_usuario
+    get_usuario,
+    reconciliar_contadores
 )
+from .log_buffer import get_log_buffer
 from .email_service import send_reminder_email
 from .telegram_service import send_reminder_telegram
 
+load_dotenv()
+
 logger = logging.getLogger(__name__)
 
+# =============================================
+# CONFIGURACIÓN DE DESPACHO
+# =============================================
+REMINDERS_MAX_CONCURRENCY = int(os.getenv("REMINDERS_MAX_CONCURRENCY", "50"))
+REMINDERS_TELEGRAM_CONCURRENCY = int(os.getenv("REMINDERS_TELEGRAM_CONCURRENCY", "25"))
+REMINDERS_EMAIL_CONCURRENCY = int(os.getenv("REMINDERS_EMAIL_CONCURRENCY", "10"))
+REMINDER_TIMEOUT = float(os.getenv("REMINDER_TIMEOUT", "60"))  # segundos por recordatorio
+
+# Cada cuántos minutos se reconcilian los contadores del dashboard
+COUNTERS_RECONCILE_MINUTES = int(os.getenv("COUNTERS_RECONCILE_MINUTES", "60"))
+
 # Scheduler global
 scheduler: AsyncIOScheduler = None
 
+# Límites de concurrencia (se crean dentro del event loop)
+_limites: Dict[str, asyncio.Semaphore] = {}
+
+
+def get_limite(nombre: str) -> asyncio.Semaphore:
+    """Obtiene el semáforo global o de un canal ('global', 'telegram', 'email')."""
+    if nombre not in _limites:
+        capacidad = {
+            "global": REMINDERS_MAX_CONCURRENCY,
+            "telegram": REMINDERS_TELEGRAM_CONCURRENCY,
+            "email": REMINDERS_EMAIL_CONCURRENCY,
+        }[nombre]
+        _limites[nombre] = asyncio.Semaphore(capacidad)
+    return _limites[nombre]
+
 
 def get_scheduler() -> AsyncIOScheduler:
     """Obtiene el scheduler singleton."""
@@ -45,7 +77,7 @@ async def process_pending_reminders():
     try:
         logger.info("🔍 Verificando recordatorios pendientes...")
         
-        pendientes = get_recordatorios_pendientes()
+        pendientes = await get_recordatorios_pendientes()
         
         if not pendientes:
             logger.debug("No hay recordatorios pendientes")
@@ -53,13 +85,51 @@ async def process_pending_reminders():
         
         logger.info(f"📋 {len(pendientes)} recordatorios para enviar")
         
+        # Todas las plantillas del lote en una sola consulta
+        await prefetch_plantillas_default(
+            [item["tarea"]["usuario_telegram_id"] for item in pendientes]
+        )
+        
+        # Un grupo por chat: los envíos a un mismo chat van en serie
+        por_chat: Dict[int, List[Dict]] = {}
         for item in pendientes:
-            await send_single_reminder(item)
+            por_chat.setdefault(item["tarea"]["usuario_telegram_id"], []).append(item)
+        
+        grupos = await asyncio.gather(*(dispatch_chat(items) for items in por_chat.values()))
+        resultados = [r for grupo in grupos for r in grupo]
+        
+        enviados = sum(1 for r in resultados if r.get("success"))
+        logger.info(f"✅ {enviados}/{len(pendientes)} recordatorios procesados")
     
     except Exception as e:
         logger.error(f"❌ Error en process_pending_reminders: {e}")
 
 
+async def dispatch_chat(items: List[Dict]) -> List[Dict[str, Any]]:
+    """
+    Envía en serie los recordatorios de un mismo chat.
+    Telegram permite ~1 mensaje/s por chat: en serie, un chat con muchos
+    recordatorios ocupa un solo cupo de los semáforos mientras espera su
+    bucket, en lugar de bloquearlos todos y frenar al resto de los usuarios.
+    """
+    return [await dispatch_reminder(item) for item in items]
+
+
+async def dispatch_reminder(item: Dict) -> Dict[str, Any]:
+    """
+    Envía un recordatorio respetando el límite global de concurrencia
+    y un timeout por recordatorio.
+    """
+    tarea_id = item["tarea"].get("id")
+    
+    async with get_limite("global"):
+        try:
+            return await asyncio.wait_for(send_single_reminder(item), timeout=REMINDER_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.error(f"⌛ Timeout enviando recordatorio tarea {tarea_id}")
+            return {"success": False, "error": f"Timeout ({REMINDER_TIMEOUT:.0f}s)"}
+
+
 async def send_single_reminder(item: Dict) -> Dict[str, Any]:
     """
     Envía un único recordatorio por el canal configurado.
@@ -86,19 +156,21 @@ async def send_single_reminder(item: Dict) -> Dict[str, Any]:
         # Enviar por Telegram
         if canal in ["telegram", "ambos"]:
             # Obtener plantilla
-            plantilla = get_plantilla_default(usuario_telegram_id, "telegram")
+            plantilla = await get_plantilla_default(usuario_telegram_id, "telegram")
             if not plantilla:
                 plantilla = {"mensaje": "⏰ *Recordatorio*\n\n📋 *{{titulo}}*\n{{descripcion}}"}
             
-            result = send_reminder_telegram(
-                chat_id=usuario_telegram_id,  # Enviar al PM
-                tarea=tarea,
-                contacto=contacto,
-                plantilla=plantilla
-            )
+            async with get_limite("telegram"):
+                result = await send_reminder_telegram(
+                    chat_id=usuario_telegram_id,  # Enviar al PM
+                    tarea=tarea,
+                    contacto=contacto,
+                    plantilla=plantilla
+                )
             
-            # Loggear
-            log_recordatorio_enviado({
+            # Loggear (escritura diferida, no demora el envío)
+            get_log_buffer().add("recordatorios_enviados", {
+                "usuario_telegram_id": usuario_telegram_id,
                 "tarea_id": tarea["id"],
                 "recordatorio_config_id": rec_config["id"],
                 "canal": "telegram",
@@ -112,7 +184,7 @@ async def send_single_reminder(item: Dict) -> Dict[str, Any]:
         # Enviar por Email (desde dominio centralizado)
         if canal in ["email", "ambos"]:
             if contacto and contacto.get("email"):
-                plantilla = get_plantilla_default(usuario_telegram_id, "email")
+                plantilla = await get_plantilla_default(usuario_telegram_id, "email")
                 if not plantilla:
                     plantilla = {
                         "asunto": "Recordatorio: {{titulo}}",
@@ -120,15 +192,17 @@ async def send_single_reminder(item: Dict) -> Dict[str, Any]:
                     }
                 
                 # Enviar email con Reply-To y CC al usuario
-                result = send_reminder_email(
-                    tarea=tarea,
-                    contacto=contacto,
-                    plantilla=plantilla,
-                    usuario_email=usuario_email  # Para Reply-To y CC
-                )
+                async with get_limite("email"):
+                    result = await send_reminder_email(
+                        tarea=tarea,
+                        contacto=contacto,
+                        plantilla=plantilla,
+                        usuario_email=usuario_email  # Para Reply-To y CC
+                    )
                 
-                # Loggear
-                log_recordatorio_enviado({
+                # Loggear (escritura diferida, no demora el envío)
+                get_log_buffer().add("recordatorios_enviados", {
+                    "usuario_telegram_id": usuario_telegram_id,
                     "tarea_id": tarea["id"],
                     "recordatorio_config_id": rec_config["id"],
                     "canal": "email",
@@ -143,7 +217,8 @@ async def send_single_reminder(item: Dict) -> Dict[str, Any]:
         
         # Registrar en historial
         if contacto:
-            log_interaccion(usuario_telegram_id, {
+            get_log_buffer().add("historial_interacciones", {
+                "usuario_telegram_id": usuario_telegram_id,
                 "contacto_id": contacto.get("id"),
                 "tarea_id": tarea["id"],
                 "tipo": "recordatorio_enviado",
@@ -161,6 +236,22 @@ async def send_single_reminder(item: Dict) -> Dict[str, Any]:
         return {"success": False, "error": str(e)}
 
 
+async def reconcile_counters():
+    """
+    Repara el drift de usuario_contadores.
+    Los triggers los mantienen al día; esto cubre cambios hechos
+    con los triggers deshabilitados o cargas masivas.
+    """
+    try:
+        corregidos = await reconciliar_contadores()
+        if corregidos:
+            logger.warning(f"🧮 Contadores corregidos: {corregidos}")
+        else:
+            logger.info("🧮 Contadores del dashboard sin diferencias")
+    except Exception as e:
+        logger.error(f"❌ Error reconciliando contadores: {e}")
+
+
 def start_scheduler():
     """
     Inicia el scheduler de tareas.
@@ -177,6 +268,15 @@ def start_scheduler():
         replace_existing=True
     )
     
+    # Reconciliación periódica de contadores del dashboard
+    scheduler.add_job(
+        reconcile_counters,
+        trigger=IntervalTrigger(minutes=COUNTERS_RECONCILE_MINUTES),
+        id="reconcile_counters",
+        name="Reconciliar contadores del dashboard",
+        replace_existing=True
+    )
+    
     if not scheduler.running:
         scheduler.start()
         logger.info("⏰ Scheduler iniciado")
@@ -185,6 +285,7 @@ def start_scheduler():
 def stop_scheduler():
     """
     Detiene el scheduler.
+    Los logs diferidos se escriben aparte con close_log_buffer() (async).
     """
     global scheduler
     if scheduler and scheduler.running:
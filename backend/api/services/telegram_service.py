@@ -8,12 +8,62 @@ import httpx
 
 from dotenv import load_dotenv
 
+from .rate_limiter import get_rate_limiter, TELEGRAM_MAX_RETRIES
+
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 TELEGRAM_API_URL = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}"
+TELEGRAM_TIMEOUT = float(os.getenv("TELEGRAM_TIMEOUT", "30"))
+TELEGRAM_MAX_CONNECTIONS = int(os.getenv("TELEGRAM_MAX_CONNECTIONS", "20"))
+
+# Cliente HTTP compartido (keep-alive + HTTP/2 hacia api.telegram.org)
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=TELEGRAM_MAX_CONNECTIONS,
+        max_keepalive_connections=TELEGRAM_MAX_CONNECTIONS,
+        keepalive_expiry=60
+    )
+
+
+def get_telegram_client() -> httpx.AsyncClient:
+    """Obtiene el cliente async compartido (lo crea si no existe)."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            base_url=TELEGRAM_API_URL,
+            http2=True,
+            timeout=TELEGRAM_TIMEOUT,
+            limits=_limits()
+        )
+    return _client
+
+
+def init_telegram_client():
+    """Crea el cliente compartido al iniciar la app (lifespan)."""
+    get_telegram_client()
+    logger.info("📱 Cliente Telegram inicializado")
+
+
+async def close_telegram_client():
+    """Cierra el cliente compartido al apagar la app (lifespan)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    logger.info("📱 Cliente Telegram cerrado")
+
+
+def _get_retry_after(result: Dict) -> Optional[float]:
+    """Devuelve retry_after si la respuesta es un 429 de Telegram."""
+    if result.get("error_code") != 429:
+        return None
+    return float((result.get("parameters") or {}).get("retry_after", 1))
 
 
 async def send_telegram_message(
@@ -24,6 +74,7 @@ async def send_telegram_message(
 ) -> Dict[str, Any]:
     """
     Envía un mensaje de Telegram.
+    Pasa por el rate limiter (global + por chat) y reintenta los 429.
     """
     if not TELEGRAM_TOKEN:
         return {"success": False, "error": "TELEGRAM_TOKEN no configurado"}
@@ -38,57 +89,18 @@ async def send_telegram_message(
         if reply_markup:
             payload["reply_markup"] = reply_markup
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{TELEGRAM_API_URL}/sendMessage",
-                json=payload,
-                timeout=30
-            )
-            result = response.json()
+        limiter = get_rate_limiter()
         
-        if result.get("ok"):
-            logger.info(f"📱 Telegram enviado a {chat_id}")
-            return {
-                "success": True,
-                "message_id": result["result"]["message_id"]
-            }
-        else:
-            error = result.get("description", "Error desconocido")
-            logger.error(f"❌ Error Telegram: {error}")
-            return {"success": False, "error": error}
-    
-    except Exception as e:
-        error_msg = f"Error enviando Telegram: {str(e)}"
-        logger.error(f"❌ {error_msg}")
-        return {"success": False, "error": error_msg}
-
-
-def send_telegram_message_sync(
-    chat_id: int,
-    text: str,
-    parse_mode: str = "Markdown"
-) -> Dict[str, Any]:
-    """
-    Versión síncrona para usar en contextos no-async.
-    """
-    import requests
-    
-    if not TELEGRAM_TOKEN:
-        return {"success": False, "error": "TELEGRAM_TOKEN no configurado"}
-    
-    try:
-        payload = {
-            "chat_id": chat_id,
-            "text": text,
-            "parse_mode": parse_mode
-        }
-        
-        response = requests.post(
-            f"{TELEGRAM_API_URL}/sendMessage",
-            json=payload,
-            timeout=30
-        )
-        result = response.json()
+        for intento in range(TELEGRAM_MAX_RETRIES + 1):
+            await limiter.acquire(chat_id)
+            response = await get_telegram_client().post("/sendMessage", json=payload)
+            result = response.json()
+            
+            # 429: respetar retry_after y reintentar
+            retry_after = _get_retry_after(result)
+            if retry_after is None or intento == TELEGRAM_MAX_RETRIES:
+                break
+            limiter.pause(retry_after)
         
         if result.get("ok"):
             logger.info(f"📱 Telegram enviado a {chat_id}")
@@ -128,20 +140,24 @@ def render_telegram_message(
         "estado": tarea.get("estado", ""),
     }
     
-    return render_template(plantilla.get("mensaje", "⏰ Recordatorio: {{titulo}}"), variables)
+    return render_template(
+        plantilla.get("mensaje", "⏰ Recordatorio: {{titulo}}"),
+        variables,
+        plantilla.get("id")
+    )
 
 
-def send_reminder_telegram(
+async def send_reminder_telegram(
     chat_id: int,
     tarea: Dict,
     contacto: Dict,
     plantilla: Dict
 ) -> Dict[str, Any]:
     """
-    Envía un recordatorio de Telegram usando plantilla.
+    Envía un recordatorio de Telegram usando plantilla (sin bloquear el event loop).
     """
     mensaje = render_telegram_message(tarea, contacto, plantilla)
-    return send_telegram_message_sync(chat_id, mensaje)
+    return await send_telegram_message(chat_id, mensaje)
 
 
 async def set_webhook(webhook_url: str) -> Dict[str, Any]:
@@ -149,13 +165,8 @@ async def set_webhook(webhook_url: str) -> Dict[str, Any]:
     Configura el webhook de Telegram.
     """
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{TELEGRAM_API_URL}/setWebhook",
-                json={"url": webhook_url},
-                timeout=30
-            )
-            result = response.json()
+        response = await get_telegram_client().post("/setWebhook", json={"url": webhook_url})
+        result = response.json()
         
         if result.get("ok"):
             logger.info(f"✅ Webhook configurado: {webhook_url}")
@@ -172,12 +183,8 @@ async def delete_webhook() -> Dict[str, Any]:
     Elimina el webhook de Telegram (para usar polling).
     """
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{TELEGRAM_API_URL}/deleteWebhook",
-                timeout=30
-            )
-            result = response.json()
+        response = await get_telegram_client().post("/deleteWebhook")
+        result = response.json()
         
         if result.get("ok"):
             logger.info("✅ Webhook eliminado")
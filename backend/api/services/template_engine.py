@@ -0,0 +1,99 @@
+"""
+Motor de Plantillas - Compilación y caché
+=========================================
+Cada plantilla se compila una sola vez en una lista de segmentos
+(literal, variable, literal, ...) cacheada por id + hash del contenido.
+Renderizar es un único join, sin str.replace ni regex por render.
+"""
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Tuple
+
+# Variables en formato: {{nombre_variable}}
+VARIABLE_PATTERN = re.compile(r'\{\{([^}]+)\}\}')
+
+TEMPLATE_CACHE_SIZE = 1024
+
+
+class CompiledTemplate:
+    """
+    Plantilla compilada.
+    literals tiene siempre un elemento más que variables:
+    literals[0] + var[0] + literals[1] + ... + literals[-1]
+    """
+
+    __slots__ = ("literals", "variables")
+
+    def __init__(self, literals: List[str], variables: List[str]):
+        self.literals = literals
+        self.variables = variables
+
+    def render(self, values: Dict[str, Any]) -> str:
+        """Renderiza con un dict de variables (faltantes o vacías -> '')."""
+        literals = self.literals
+        parts = [literals[0]]
+        for i, name in enumerate(self.variables, 1):
+            value = values.get(name)
+            parts.append(str(value) if value else "")
+            parts.append(literals[i])
+        return "".join(parts)
+
+    def render_many(self, values_list: List[Dict[str, Any]]) -> List[str]:
+        """Renderiza la misma plantilla contra muchos dicts de variables."""
+        return [self.render(values) for values in values_list]
+
+
+def _compile(template: str) -> CompiledTemplate:
+    literals = []
+    variables = []
+    pos = 0
+    for match in VARIABLE_PATTERN.finditer(template):
+        literals.append(template[pos:match.start()])
+        variables.append(match.group(1))
+        pos = match.end()
+    literals.append(template[pos:])
+    return CompiledTemplate(literals, variables)
+
+
+_cache: "OrderedDict[Tuple[Any, str], CompiledTemplate]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def compile_template(template: str, template_id: Optional[int] = None) -> CompiledTemplate:
+    """
+    Compila (o recupera del caché LRU) una plantilla.
+    La clave incluye el hash del contenido: editar una plantilla
+    genera una entrada nueva sin necesidad de invalidar.
+    """
+    key = (template_id, hashlib.sha1(template.encode("utf-8")).hexdigest())
+
+    with _cache_lock:
+        compiled = _cache.get(key)
+        if compiled is not None:
+            _cache.move_to_end(key)
+            return compiled
+
+    compiled = _compile(template)
+
+    with _cache_lock:
+        _cache[key] = compiled
+        if len(_cache) > TEMPLATE_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+    return compiled
+
+
+def render(template: str, variables: Dict[str, Any], template_id: Optional[int] = None) -> str:
+    """Renderiza una plantilla usando el caché de compilación."""
+    return compile_template(template, template_id).render(variables)
+
+
+def render_many(
+    template: str,
+    variables_list: List[Dict[str, Any]],
+    template_id: Optional[int] = None
+) -> List[str]:
+    """Renderiza una plantilla contra muchos dicts de variables (compila una vez)."""
+    return compile_template(template, template_id).render_many(variables_list)
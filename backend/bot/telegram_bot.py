@@ -14,9 +14,10 @@ from dateutil.relativedelta import relativedelta, MO, TU, WE, TH, FR, SA, SU
 from dotenv import load_dotenv
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, ReplyKeyboardRemove
+from telegram.error import RetryAfter
 from telegram.ext import (
     ApplicationBuilder, ContextTypes, CommandHandler, MessageHandler,
-    CallbackQueryHandler, ConversationHandler, filters
+    CallbackQueryHandler, ConversationHandler, BaseRateLimiter, filters
 )
 
 # Importar servicios
@@ -25,15 +26,17 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from api.services.database import (
     get_or_create_usuario, get_usuario, update_usuario,
-    create_contacto, get_contactos, get_contacto, delete_contacto,
-    create_tarea, get_tareas, get_tarea, update_tarea, delete_tarea,
-    get_tareas_pendientes_hoy, cambiar_estado_tarea,
-    create_proyecto, get_proyectos, get_proyecto,
-    get_plantillas, get_dashboard_stats,
-    create_recordatorio_config
+    create_contacto, get_contactos, get_contactos_pagina, get_contacto, delete_contacto,
+    create_tarea, get_tareas_pagina, get_tarea, update_tarea, delete_tarea,
+    get_tareas_hoy_pagina, cambiar_estado_tarea,
+    create_proyecto, get_proyectos_pagina, get_proyecto,
+    get_plantillas, get_dashboard_stats
 )
 from api.services.email_service import test_gmail_connection
 from api.services.scheduler import start_scheduler, process_pending_reminders
+from api.services.telegram_service import close_telegram_client
+from api.services.log_buffer import close_log_buffer
+from api.services.rate_limiter import get_rate_limiter, TELEGRAM_MAX_RETRIES
 
 load_dotenv()
 
@@ -163,7 +166,9 @@ async def contactos_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Comando /contactos - Listar contactos."""
     telegram_id = update.effective_user.id
     
-    contactos = get_contactos(telegram_id)
+    # Solo lo que se muestra; next_cursor indica si hay más
+    pagina = get_contactos_pagina(telegram_id, limit=20, fields="summary")
+    contactos = pagina["items"]
     
     if not contactos:
         await update.message.reply_text(
@@ -173,15 +178,15 @@ async def contactos_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     text = "👥 *Tus Contactos:*\n\n"
-    for i, c in enumerate(contactos[:20], 1):
+    for i, c in enumerate(contactos, 1):
         email_icon = "📧" if c.get('email') else ""
         tg_icon = "📱" if c.get('telegram_id') else ""
         text += f"{i}. *{c['nombre']}* {email_icon}{tg_icon}\n"
         if c.get('empresa'):
             text += f"   🏢 {c['empresa']}\n"
     
-    if len(contactos) > 20:
-        text += f"\n_...y {len(contactos) - 20} más_"
+    if pagina["next_cursor"]:
+        text += "\n_...y más. Usa /buscar para encontrar uno_"
     
     text += "\n\nUsa /contacto\\_\\[número\\] para ver detalles"
     
@@ -319,8 +324,8 @@ async def tareas_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Comando /tareas - Listar tareas pendientes."""
     telegram_id = update.effective_user.id
     
-    tareas = get_tareas(telegram_id)
-    tareas_activas = [t for t in tareas if t.get('estado') != 'completado']
+    pagina = get_tareas_pagina(telegram_id, limit=15, fields="summary", excluir_estado="completado")
+    tareas_activas = pagina["items"]
     
     if not tareas_activas:
         await update.message.reply_text(
@@ -337,7 +342,7 @@ async def tareas_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         'esperando_respuesta': '🟠'
     }
     
-    for t in tareas_activas[:15]:
+    for t in tareas_activas:
         emoji = estados_emoji.get(t.get('estado', 'pendiente'), '⚪')
         fecha = t.get('fecha_vencimiento', '')[:10] if t.get('fecha_vencimiento') else 'Sin fecha'
         
@@ -348,8 +353,8 @@ async def tareas_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             text += f" | 👤 {t['contactos']['nombre']}"
         text += "\n"
     
-    if len(tareas_activas) > 15:
-        text += f"\n_...y {len(tareas_activas) - 15} más_"
+    if pagina["next_cursor"]:
+        text += "\n_...y más_"
     
     text += "\n\n• /completar \\[id\\] - Marcar completada\n• /tarea \\[id\\] - Ver detalles"
     
@@ -360,7 +365,8 @@ async def tareas_hoy_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
     """Comando /hoy - Tareas de hoy."""
     telegram_id = update.effective_user.id
     
-    tareas = get_tareas_pendientes_hoy(telegram_id)
+    pagina = get_tareas_hoy_pagina(telegram_id, limit=20, fields="id,titulo,estado,descripcion")
+    tareas = pagina["items"]
     
     if not tareas:
         await update.message.reply_text("✨ No tienes tareas para hoy. ¡Buen trabajo!")
@@ -373,6 +379,9 @@ async def tareas_hoy_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
         if t.get('descripcion'):
             text += f"   _{t['descripcion'][:50]}..._\n" if len(t.get('descripcion', '')) > 50 else f"   _{t['descripcion']}_\n"
     
+    if pagina["next_cursor"]:
+        text += "\n_...y más_"
+    
     await update.message.reply_text(text, parse_mode='Markdown')
 
 
@@ -410,10 +419,10 @@ async def nueva_tarea_titulo(update: Update, context: ContextTypes.DEFAULT_TYPE)
     telegram_id = update.effective_user.id
     context.user_data['nueva_tarea'] = {'titulo': update.message.text}
     
-    contactos = get_contactos(telegram_id)
+    contactos = get_contactos_pagina(telegram_id, limit=5, fields="id,nombre")["items"]
     
     if contactos:
-        keyboard = [[InlineKeyboardButton(c['nombre'], callback_data=f"contacto_{c['id']}")] for c in contactos[:5]]
+        keyboard = [[InlineKeyboardButton(c['nombre'], callback_data=f"contacto_{c['id']}")] for c in contactos]
         keyboard.append([InlineKeyboardButton("⏭ Sin contacto", callback_data="contacto_none")])
         
         await update.message.reply_text(
@@ -556,21 +565,11 @@ async def nueva_tarea_descripcion(update: Update, context: ContextTypes.DEFAULT_
             'canal_notificacion': 'telegram'
         }
         
-        tarea = create_tarea(telegram_id, tarea_data)
-        
-        # Crear recordatorio por defecto (1 día antes)
-        create_recordatorio_config(tarea['id'], {
-            'dias_antes': 1,
-            'hora': '09:00:00',
-            'canal': 'telegram'
-        })
-        
-        # Crear recordatorio el mismo día
-        create_recordatorio_config(tarea['id'], {
-            'dias_antes': 0,
-            'hora': hora.strftime('%H:%M:%S'),
-            'canal': 'telegram'
-        })
+        # Tarea + recordatorios (1 día antes y el mismo día) en una sola llamada
+        tarea = create_tarea(telegram_id, tarea_data, [
+            {'dias_antes': 1, 'hora': '09:00:00', 'canal': 'telegram'},
+            {'dias_antes': 0, 'hora': hora.strftime('%H:%M:%S'), 'canal': 'telegram'}
+        ])
         
         await msg.reply_text(
             f"✅ *Tarea creada* (ID: {tarea['id']})\n\n"
@@ -595,7 +594,8 @@ async def proyectos_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Comando /proyectos - Listar proyectos."""
     telegram_id = update.effective_user.id
     
-    proyectos = get_proyectos(telegram_id)
+    pagina = get_proyectos_pagina(telegram_id, limit=15, fields="summary")
+    proyectos = pagina["items"]
     
     if not proyectos:
         await update.message.reply_text(
@@ -608,12 +608,15 @@ async def proyectos_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     estados_emoji = {'activo': '🟢', 'pausado': '🟡', 'completado': '✅', 'cancelado': '❌'}
     
-    for p in proyectos[:15]:
+    for p in proyectos:
         emoji = estados_emoji.get(p.get('estado', 'activo'), '⚪')
         text += f"{emoji} *{p['nombre']}* (ID: {p['id']})\n"
         if p.get('descripcion'):
             text += f"   _{p['descripcion'][:40]}..._\n" if len(p.get('descripcion', '')) > 40 else f"   _{p['descripcion']}_\n"
     
+    if pagina["next_cursor"]:
+        text += "\n_...y más_"
+    
     await update.message.reply_text(text, parse_mode='Markdown')
 
 
@@ -864,14 +867,10 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             'canal_notificacion': 'telegram'
         }
         
-        tarea = create_tarea(telegram_id, tarea_data)
-        
-        # Crear recordatorio
-        create_recordatorio_config(tarea['id'], {
-            'dias_antes': 0,
-            'hora': parsed['hora'].strftime('%H:%M:%S'),
-            'canal': 'telegram'
-        })
+        # Tarea + recordatorio en una sola llamada
+        create_tarea(telegram_id, tarea_data, [
+            {'dias_antes': 0, 'hora': parsed['hora'].strftime('%H:%M:%S'), 'canal': 'telegram'}
+        ])
         
         await update.message.reply_text(
             f"✅ *Recordatorio creado*\n\n"
@@ -889,6 +888,43 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # MAIN
 # =============================================
 
+class BotRateLimiter(BaseRateLimiter):
+    """
+    Aplica el rate limiter compartido a todas las llamadas del bot que
+    tienen chat_id (respuestas, mensajes) y reintenta los 429 (RetryAfter).
+    """
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        limiter = get_rate_limiter()
+        chat_id = data.get("chat_id")
+        
+        for intento in range(TELEGRAM_MAX_RETRIES + 1):
+            # getUpdates, answerCallbackQuery, etc. no cuentan contra los límites de envío
+            if chat_id is not None:
+                await limiter.acquire(chat_id)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if intento == TELEGRAM_MAX_RETRIES:
+                    raise
+                retry_after = e.retry_after
+                if isinstance(retry_after, datetime.timedelta):
+                    retry_after = retry_after.total_seconds()
+                limiter.pause(float(retry_after))
+
+
+async def on_shutdown(application):
+    """Escribe los logs pendientes y libera el cliente HTTP de los recordatorios."""
+    await close_log_buffer()
+    await close_telegram_client()
+
+
 def main():
     """Punto de entrada principal."""
     if not TELEGRAM_TOKEN:
@@ -897,7 +933,11 @@ def main():
     
     logger.info("🚀 Iniciando CRM Bot...")
     
-    app = ApplicationBuilder().token(TELEGRAM_TOKEN).build()
+    app = ApplicationBuilder()\
+        .token(TELEGRAM_TOKEN)\
+        .rate_limiter(BotRateLimiter())\
+        .post_shutdown(on_shutdown)\
+        .build()
     
     # Comandos básicos
     app.add_handler(CommandHandler("start", start_command))
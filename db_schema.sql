@@ -190,6 +190,651 @@ CREATE TRIGGER update_tareas_updated_at
 -- =============================================
 -- Las plantillas por defecto se crean cuando el usuario se registra
 
+-- =============================================
+-- 12. PRÓXIMO DISPARO DE RECORDATORIOS (next_fire_at)
+-- =============================================
+-- Momento exacto en que se envía cada recordatorio, precalculado.
+-- El scheduler consulta next_fire_at <= ahora y solo lee filas vencidas.
+ALTER TABLE recordatorios_config ADD COLUMN IF NOT EXISTS next_fire_at TIMESTAMP WITH TIME ZONE;
+
+CREATE INDEX IF NOT EXISTS idx_recordatorios_config_next_fire
+    ON recordatorios_config(next_fire_at)
+    WHERE activo;
+
+-- (día de vencimiento - dias_antes) a la hora configurada, en la zona del usuario
+CREATE OR REPLACE FUNCTION calcular_next_fire_at(
+    p_fecha_vencimiento TIMESTAMP WITH TIME ZONE,
+    p_dias_antes INT,
+    p_hora TIME,
+    p_timezone VARCHAR
+)
+RETURNS TIMESTAMP WITH TIME ZONE AS $$
+    SELECT CASE
+        WHEN p_fecha_vencimiento IS NULL THEN NULL
+        ELSE (((p_fecha_vencimiento AT TIME ZONE p_timezone)::date - p_dias_antes) + p_hora)
+             AT TIME ZONE p_timezone
+    END;
+$$ LANGUAGE sql STABLE;
+
+-- Al crear/editar un recordatorio (dias_antes, hora)
+CREATE OR REPLACE FUNCTION set_recordatorio_next_fire_at()
+RETURNS TRIGGER AS $$
+BEGIN
+    SELECT calcular_next_fire_at(
+               t.fecha_vencimiento, NEW.dias_antes, NEW.hora,
+               COALESCE(u.timezone, 'America/Argentina/Buenos_Aires'))
+      INTO NEW.next_fire_at
+      FROM tareas t
+      LEFT JOIN usuarios u ON u.telegram_id = t.usuario_telegram_id
+     WHERE t.id = NEW.tarea_id;
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS set_recordatorios_config_next_fire ON recordatorios_config;
+CREATE TRIGGER set_recordatorios_config_next_fire
+    BEFORE INSERT OR UPDATE OF tarea_id, dias_antes, hora ON recordatorios_config
+    FOR EACH ROW
+    EXECUTE FUNCTION set_recordatorio_next_fire_at();
+
+-- Al cambiar la fecha de vencimiento de una tarea
+CREATE OR REPLACE FUNCTION sync_tarea_next_fire_at()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.fecha_vencimiento IS DISTINCT FROM OLD.fecha_vencimiento THEN
+        UPDATE recordatorios_config rc
+           SET next_fire_at = calcular_next_fire_at(
+                   NEW.fecha_vencimiento, rc.dias_antes, rc.hora,
+                   COALESCE(u.timezone, 'America/Argentina/Buenos_Aires'))
+          FROM usuarios u
+         WHERE rc.tarea_id = NEW.id
+           AND u.telegram_id = NEW.usuario_telegram_id;
+    END IF;
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS sync_tareas_next_fire ON tareas;
+CREATE TRIGGER sync_tareas_next_fire
+    AFTER UPDATE OF fecha_vencimiento ON tareas
+    FOR EACH ROW
+    EXECUTE FUNCTION sync_tarea_next_fire_at();
+
+-- Al cambiar la zona horaria de un usuario
+CREATE OR REPLACE FUNCTION sync_usuario_next_fire_at()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.timezone IS DISTINCT FROM OLD.timezone THEN
+        UPDATE recordatorios_config rc
+           SET next_fire_at = calcular_next_fire_at(
+                   t.fecha_vencimiento, rc.dias_antes, rc.hora,
+                   COALESCE(NEW.timezone, 'America/Argentina/Buenos_Aires'))
+          FROM tareas t
+         WHERE rc.tarea_id = t.id
+           AND t.usuario_telegram_id = NEW.telegram_id;
+    END IF;
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS sync_usuarios_next_fire ON usuarios;
+CREATE TRIGGER sync_usuarios_next_fire
+    AFTER UPDATE OF timezone ON usuarios
+    FOR EACH ROW
+    EXECUTE FUNCTION sync_usuario_next_fire_at();
+
+-- Backfill de recordatorios existentes
+UPDATE recordatorios_config rc
+   SET next_fire_at = calcular_next_fire_at(
+           t.fecha_vencimiento, rc.dias_antes, rc.hora,
+           COALESCE(u.timezone, 'America/Argentina/Buenos_Aires'))
+  FROM tareas t
+  LEFT JOIN usuarios u ON u.telegram_id = t.usuario_telegram_id
+ WHERE rc.tarea_id = t.id
+   AND rc.next_fire_at IS NULL;
+
+-- =============================================
+-- 13. DISPAROS DE RECORDATORIOS (idempotencia)
+-- =============================================
+-- Un recordatorio se dispara como máximo una vez por día.
+-- El scheduler reclama (config, fecha) con ON CONFLICT DO NOTHING:
+-- solo quien inserta la fila envía el mensaje.
+CREATE TABLE IF NOT EXISTS recordatorios_disparos (
+    recordatorio_config_id INT NOT NULL REFERENCES recordatorios_config(id) ON DELETE CASCADE,
+    fecha_disparo DATE NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (recordatorio_config_id, fecha_disparo)
+);
+
+-- Backfill desde el log para no reenviar lo ya enviado
+INSERT INTO recordatorios_disparos (recordatorio_config_id, fecha_disparo)
+SELECT DISTINCT recordatorio_config_id, (fecha_envio AT TIME ZONE 'America/Argentina/Buenos_Aires')::date
+  FROM recordatorios_enviados
+ WHERE recordatorio_config_id IS NOT NULL
+ON CONFLICT DO NOTHING;
+
+-- =============================================
+-- 14. ÍNDICES DEL TABLERO KANBAN
+-- =============================================
+-- Cada columna lee sus primeras N tarjetas por índice, en el mismo
+-- orden que usa la paginación keyset de la API.
+CREATE INDEX IF NOT EXISTS idx_tareas_kanban
+    ON tareas(usuario_telegram_id, estado, fecha_vencimiento, id);
+
+-- Completadas: las más recientes primero
+CREATE INDEX IF NOT EXISTS idx_tareas_kanban_completadas
+    ON tareas(usuario_telegram_id, updated_at DESC, id DESC)
+    WHERE estado = 'completado';
+
+-- =============================================
+-- 15. CONTADORES POR USUARIO (mantenidos por triggers)
+-- =============================================
+-- Una fila por (usuario, clave):
+--   'contactos', 'proyectos_activos', 'tareas:<estado>'
+-- Los triggers ajustan los totales en cada INSERT/UPDATE/DELETE, así el
+-- dashboard lee contadores en O(1) en vez de contar las tablas.
+-- Sin FK a usuarios: los borrados en cascada disparan los triggers
+-- mientras el usuario se elimina; la reconciliación limpia los huérfanos.
+CREATE TABLE IF NOT EXISTS usuario_contadores (
+    usuario_telegram_id BIGINT NOT NULL,
+    clave VARCHAR(80) NOT NULL,
+    total INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (usuario_telegram_id, clave)
+);
+
+CREATE OR REPLACE FUNCTION ajustar_contador(p_usuario BIGINT, p_clave TEXT, p_delta INT)
+RETURNS VOID AS $$
+    INSERT INTO usuario_contadores (usuario_telegram_id, clave, total)
+    VALUES (p_usuario, p_clave, GREATEST(p_delta, 0))
+    ON CONFLICT (usuario_telegram_id, clave)
+    DO UPDATE SET total = GREATEST(usuario_contadores.total + p_delta, 0),
+                  updated_at = NOW();
+$$ LANGUAGE sql;
+
+-- Contactos
+CREATE OR REPLACE FUNCTION contar_contactos()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM ajustar_contador(OLD.usuario_telegram_id, 'contactos', -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM ajustar_contador(NEW.usuario_telegram_id, 'contactos', 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS contar_contactos ON contactos;
+CREATE TRIGGER contar_contactos
+    AFTER INSERT OR DELETE OR UPDATE OF usuario_telegram_id ON contactos
+    FOR EACH ROW
+    EXECUTE FUNCTION contar_contactos();
+
+-- Proyectos activos
+CREATE OR REPLACE FUNCTION contar_proyectos()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.estado = 'activo' THEN
+        PERFORM ajustar_contador(OLD.usuario_telegram_id, 'proyectos_activos', -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.estado = 'activo' THEN
+        PERFORM ajustar_contador(NEW.usuario_telegram_id, 'proyectos_activos', 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS contar_proyectos ON proyectos;
+CREATE TRIGGER contar_proyectos
+    AFTER INSERT OR DELETE OR UPDATE OF estado, usuario_telegram_id ON proyectos
+    FOR EACH ROW
+    EXECUTE FUNCTION contar_proyectos();
+
+-- Tareas por estado
+CREATE OR REPLACE FUNCTION contar_tareas()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.estado IS NOT NULL THEN
+        PERFORM ajustar_contador(OLD.usuario_telegram_id, 'tareas:' || OLD.estado, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.estado IS NOT NULL THEN
+        PERFORM ajustar_contador(NEW.usuario_telegram_id, 'tareas:' || NEW.estado, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS contar_tareas ON tareas;
+CREATE TRIGGER contar_tareas
+    AFTER INSERT OR DELETE OR UPDATE OF estado, usuario_telegram_id ON tareas
+    FOR EACH ROW
+    EXECUTE FUNCTION contar_tareas();
+
+-- Reconciliación: recalcula los totales reales, corrige las filas que
+-- difieren y borra contadores de usuarios eliminados.
+-- Devuelve la cantidad de filas corregidas.
+CREATE OR REPLACE FUNCTION reconciliar_contadores()
+RETURNS INT AS $$
+DECLARE
+    corregidos INT;
+BEGIN
+    WITH reales AS (
+        SELECT usuario_telegram_id, 'contactos'::TEXT AS clave, count(*)::INT AS total
+          FROM contactos GROUP BY usuario_telegram_id
+        UNION ALL
+        SELECT usuario_telegram_id, 'proyectos_activos', count(*)::INT
+          FROM proyectos WHERE estado = 'activo' GROUP BY usuario_telegram_id
+        UNION ALL
+        SELECT usuario_telegram_id, 'tareas:' || estado, count(*)::INT
+          FROM tareas WHERE estado IS NOT NULL GROUP BY usuario_telegram_id, estado
+    )
+    INSERT INTO usuario_contadores (usuario_telegram_id, clave, total)
+    SELECT usuario_telegram_id, clave, COALESCE(r.total, 0)
+      FROM reales r
+      FULL JOIN usuario_contadores c USING (usuario_telegram_id, clave)
+     WHERE c.total IS DISTINCT FROM COALESCE(r.total, 0)
+    ON CONFLICT (usuario_telegram_id, clave)
+    DO UPDATE SET total = EXCLUDED.total, updated_at = NOW();
+    
+    GET DIAGNOSTICS corregidos = ROW_COUNT;
+    
+    DELETE FROM usuario_contadores c
+     WHERE NOT EXISTS (SELECT 1 FROM usuarios u WHERE u.telegram_id = c.usuario_telegram_id);
+    
+    RETURN corregidos;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Carga inicial
+SELECT reconciliar_contadores();
+
+-- =============================================
+-- 16. ESTADÍSTICAS DEL DASHBOARD (un solo round-trip)
+-- =============================================
+-- Devuelve contadores y próximos vencimientos (7 días) en un JSON con
+-- la misma forma que espera la API. Los totales salen de
+-- usuario_contadores; solo los rangos de fecha tocan tareas (por índice).
+-- Los límites del día se pasan desde la app (zona horaria del servidor).
+CREATE INDEX IF NOT EXISTS idx_tareas_usuario_vencimiento
+    ON tareas(usuario_telegram_id, fecha_vencimiento);
+
+CREATE OR REPLACE FUNCTION dashboard_stats(
+    p_usuario BIGINT,
+    p_inicio_dia TIMESTAMP WITH TIME ZONE,
+    p_fin_dia TIMESTAMP WITH TIME ZONE,
+    p_ahora TIMESTAMP WITH TIME ZONE
+)
+RETURNS JSON AS $$
+    WITH contadores AS (
+        SELECT clave, total FROM usuario_contadores WHERE usuario_telegram_id = p_usuario
+    ),
+    abiertas AS (
+        SELECT substr(clave, 8) AS estado, total
+          FROM contadores
+         WHERE clave LIKE 'tareas:%' AND clave <> 'tareas:completado' AND total > 0
+    )
+    SELECT json_build_object(
+        'total_contactos', COALESCE((SELECT total FROM contadores WHERE clave = 'contactos'), 0),
+        'total_tareas_pendientes', COALESCE((SELECT sum(total) FROM abiertas), 0),
+        'total_tareas_hoy', (
+            SELECT count(*) FROM tareas
+             WHERE usuario_telegram_id = p_usuario
+               AND fecha_vencimiento BETWEEN p_inicio_dia AND p_fin_dia
+        ),
+        'total_proyectos_activos', COALESCE((SELECT total FROM contadores WHERE clave = 'proyectos_activos'), 0),
+        'tareas_por_estado', COALESCE((SELECT json_object_agg(estado, total) FROM abiertas), '{}'::json),
+        'proximos_vencimientos', COALESCE((
+            SELECT json_agg(p.tarea ORDER BY p.fecha_vencimiento)
+              FROM (
+                -- Sin la columna interna fts (sección 18)
+                SELECT (to_jsonb(t) - 'fts') || jsonb_build_object('contactos',
+                           CASE WHEN c.id IS NULL THEN NULL
+                                ELSE jsonb_build_object('nombre', c.nombre) END) AS tarea,
+                       t.fecha_vencimiento
+                  FROM tareas t
+                  LEFT JOIN contactos c ON c.id = t.contacto_id
+                 WHERE t.usuario_telegram_id = p_usuario
+                   AND t.estado <> 'completado'
+                   AND t.fecha_vencimiento BETWEEN p_ahora AND p_ahora + INTERVAL '7 days'
+                 ORDER BY t.fecha_vencimiento
+                 LIMIT 10
+              ) p
+        ), '[]'::json)
+    );
+$$ LANGUAGE sql STABLE;
+
+-- =============================================
+-- 17. BÚSQUEDA DIFUSA DE CONTACTOS (pg_trgm)
+-- =============================================
+-- Índice GIN de trigramas sobre nombre + empresa + email, compuesto con
+-- el usuario (btree_gin) para que la búsqueda no dependa del tamaño total.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS btree_gin;
+
+ALTER TABLE contactos ADD COLUMN IF NOT EXISTS busqueda TEXT
+    GENERATED ALWAYS AS (
+        lower(nombre || ' ' || COALESCE(empresa, '') || ' ' || COALESCE(email, ''))
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_contactos_busqueda_trgm
+    ON contactos USING GIN (usuario_telegram_id, busqueda gin_trgm_ops);
+
+-- Coincidencia por palabra parecida (<%) o por subcadena (LIKE),
+-- ambas resueltas por el índice. Orden: similitud, luego nombre.
+-- Devuelve columnas explícitas: la columna interna busqueda no sale del RPC.
+DROP FUNCTION IF EXISTS buscar_contactos(BIGINT, TEXT, INT);
+CREATE OR REPLACE FUNCTION buscar_contactos(p_usuario BIGINT, p_termino TEXT, p_limite INT DEFAULT 20)
+RETURNS TABLE (
+    id INT,
+    usuario_telegram_id BIGINT,
+    nombre VARCHAR,
+    email VARCHAR,
+    telefono VARCHAR,
+    telegram_id BIGINT,
+    empresa VARCHAR,
+    notas TEXT,
+    created_at TIMESTAMPTZ,
+    updated_at TIMESTAMPTZ
+) AS $$
+    WITH q AS (
+        SELECT lower(p_termino) AS termino,
+               '%' || replace(replace(replace(lower(p_termino), '\', '\\'), '%', '\%'), '_', '\_') || '%' AS patron
+    )
+    SELECT c.id, c.usuario_telegram_id, c.nombre, c.email, c.telefono,
+           c.telegram_id, c.empresa, c.notas, c.created_at, c.updated_at
+      FROM contactos c, q
+     WHERE c.usuario_telegram_id = p_usuario
+       AND (q.termino <% c.busqueda OR c.busqueda LIKE q.patron)
+     ORDER BY word_similarity(q.termino, c.busqueda) DESC, c.nombre, c.id
+     LIMIT p_limite;
+$$ LANGUAGE sql STABLE;
+
+-- =============================================
+-- 18. BÚSQUEDA DE TEXTO COMPLETO (español)
+-- =============================================
+-- Columna tsvector generada + índice GIN compuesto con el usuario
+-- (btree_gin, ver sección 17) en cada entidad buscable.
+ALTER TABLE tareas ADD COLUMN IF NOT EXISTS fts TSVECTOR
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('spanish', COALESCE(titulo, '')), 'A') ||
+        setweight(to_tsvector('spanish', COALESCE(descripcion, '')), 'B')
+    ) STORED;
+CREATE INDEX IF NOT EXISTS idx_tareas_fts ON tareas USING GIN (usuario_telegram_id, fts);
+
+ALTER TABLE proyectos ADD COLUMN IF NOT EXISTS fts TSVECTOR
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('spanish', COALESCE(nombre, '')), 'A') ||
+        setweight(to_tsvector('spanish', COALESCE(descripcion, '')), 'B')
+    ) STORED;
+CREATE INDEX IF NOT EXISTS idx_proyectos_fts ON proyectos USING GIN (usuario_telegram_id, fts);
+
+ALTER TABLE plantillas ADD COLUMN IF NOT EXISTS fts TSVECTOR
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('spanish', COALESCE(nombre, '')), 'A') ||
+        setweight(to_tsvector('spanish', COALESCE(asunto, '')), 'B') ||
+        setweight(to_tsvector('spanish', COALESCE(mensaje, '')), 'C')
+    ) STORED;
+CREATE INDEX IF NOT EXISTS idx_plantillas_fts ON plantillas USING GIN (usuario_telegram_id, fts);
+
+ALTER TABLE historial_interacciones ADD COLUMN IF NOT EXISTS fts TSVECTOR
+    GENERATED ALWAYS AS (to_tsvector('spanish', COALESCE(descripcion, ''))) STORED;
+CREATE INDEX IF NOT EXISTS idx_historial_fts ON historial_interacciones USING GIN (usuario_telegram_id, fts);
+
+-- Búsqueda unificada: un grupo por entidad con total, resultados
+-- ordenados por relevancia y fragmentos resaltados con <mark>.
+-- ts_headline solo se calcula para la página devuelta.
+-- p_tipos restringe los grupos (NULL = todos).
+-- Escapa texto del usuario antes de ts_headline: el único HTML del
+-- highlight son las marcas <mark> que agrega la búsqueda.
+-- (El parser trata &amp; y similares como entidades: no se resaltan.)
+CREATE OR REPLACE FUNCTION escape_html(p_texto TEXT)
+RETURNS TEXT AS $$
+    SELECT replace(replace(replace(replace(replace(
+        p_texto, '&', '&amp;'), '<', '&lt;'), '>', '&gt;'), '"', '&quot;'), '''', '&#39;');
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION buscar_global(
+    p_usuario BIGINT,
+    p_consulta TEXT,
+    p_limite INT DEFAULT 10,
+    p_offset INT DEFAULT 0,
+    p_tipos TEXT[] DEFAULT NULL
+)
+RETURNS JSON AS $$
+    WITH q AS (
+        SELECT websearch_to_tsquery('spanish', p_consulta) AS tsq,
+               'StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=20, MinWords=5' AS opciones
+    ),
+    tareas_m AS (
+        SELECT t.id, t.titulo, t.descripcion, t.estado, t.fecha_vencimiento, ts_rank(t.fts, q.tsq) AS rank
+          FROM tareas t, q
+         WHERE (p_tipos IS NULL OR 'tareas' = ANY(p_tipos))
+           AND t.usuario_telegram_id = p_usuario AND t.fts @@ q.tsq
+    ),
+    proyectos_m AS (
+        SELECT p.id, p.nombre, p.descripcion, p.estado, ts_rank(p.fts, q.tsq) AS rank
+          FROM proyectos p, q
+         WHERE (p_tipos IS NULL OR 'proyectos' = ANY(p_tipos))
+           AND p.usuario_telegram_id = p_usuario AND p.fts @@ q.tsq
+    ),
+    plantillas_m AS (
+        SELECT p.id, p.nombre, p.tipo, p.asunto, p.mensaje, ts_rank(p.fts, q.tsq) AS rank
+          FROM plantillas p, q
+         WHERE (p_tipos IS NULL OR 'plantillas' = ANY(p_tipos))
+           AND p.usuario_telegram_id = p_usuario AND p.fts @@ q.tsq
+    ),
+    historial_m AS (
+        SELECT h.id, h.contacto_id, h.tarea_id, h.tipo, h.descripcion, h.created_at, ts_rank(h.fts, q.tsq) AS rank
+          FROM historial_interacciones h, q
+         WHERE (p_tipos IS NULL OR 'historial' = ANY(p_tipos))
+           AND h.usuario_telegram_id = p_usuario AND h.fts @@ q.tsq
+    )
+    SELECT json_build_object(
+        'tareas', json_build_object(
+            'total', (SELECT count(*) FROM tareas_m),
+            'items', COALESCE((
+                SELECT json_agg(r ORDER BY r.rank DESC, r.id DESC)
+                  FROM (
+                    SELECT m.id, m.titulo, m.estado, m.fecha_vencimiento, m.rank,
+                           ts_headline('spanish', escape_html(m.titulo || ' ' || COALESCE(m.descripcion, '')), q.tsq, q.opciones) AS highlight
+                      FROM tareas_m m, q
+                     ORDER BY m.rank DESC, m.id DESC
+                     LIMIT p_limite OFFSET p_offset
+                  ) r
+            ), '[]'::json)
+        ),
+        'proyectos', json_build_object(
+            'total', (SELECT count(*) FROM proyectos_m),
+            'items', COALESCE((
+                SELECT json_agg(r ORDER BY r.rank DESC, r.id DESC)
+                  FROM (
+                    SELECT m.id, m.nombre, m.estado, m.rank,
+                           ts_headline('spanish', escape_html(m.nombre || ' ' || COALESCE(m.descripcion, '')), q.tsq, q.opciones) AS highlight
+                      FROM proyectos_m m, q
+                     ORDER BY m.rank DESC, m.id DESC
+                     LIMIT p_limite OFFSET p_offset
+                  ) r
+            ), '[]'::json)
+        ),
+        'plantillas', json_build_object(
+            'total', (SELECT count(*) FROM plantillas_m),
+            'items', COALESCE((
+                SELECT json_agg(r ORDER BY r.rank DESC, r.id DESC)
+                  FROM (
+                    SELECT m.id, m.nombre, m.tipo, m.rank,
+                           ts_headline('spanish', escape_html(COALESCE(m.asunto, '') || ' ' || m.mensaje), q.tsq, q.opciones) AS highlight
+                      FROM plantillas_m m, q
+                     ORDER BY m.rank DESC, m.id DESC
+                     LIMIT p_limite OFFSET p_offset
+                  ) r
+            ), '[]'::json)
+        ),
+        'historial', json_build_object(
+            'total', (SELECT count(*) FROM historial_m),
+            'items', COALESCE((
+                SELECT json_agg(r ORDER BY r.rank DESC, r.id DESC)
+                  FROM (
+                    SELECT m.id, m.contacto_id, m.tarea_id, m.tipo, m.created_at, m.rank,
+                           ts_headline('spanish', escape_html(COALESCE(m.descripcion, '')), q.tsq, q.opciones) AS highlight
+                      FROM historial_m m, q
+                     ORDER BY m.rank DESC, m.id DESC
+                     LIMIT p_limite OFFSET p_offset
+                  ) r
+            ), '[]'::json)
+        )
+    );
+$$ LANGUAGE sql STABLE;
+
+-- =============================================
+-- 19. RECORDATORIOS CON VERIFICACIÓN DE PERTENENCIA
+-- =============================================
+-- Crear/eliminar un recordatorio comprobando en la misma sentencia que
+-- la tarea es del usuario (un solo round-trip desde la API).
+CREATE OR REPLACE FUNCTION crear_recordatorio_config(
+    p_usuario BIGINT,
+    p_tarea INT,
+    p_dias_antes INT DEFAULT 0,
+    p_hora TIME DEFAULT '09:00',
+    p_canal VARCHAR DEFAULT 'telegram',
+    p_activo BOOLEAN DEFAULT TRUE
+)
+RETURNS SETOF recordatorios_config AS $$
+    INSERT INTO recordatorios_config (tarea_id, dias_antes, hora, canal, activo)
+    SELECT t.id, p_dias_antes, p_hora, p_canal, p_activo
+      FROM tareas t
+     WHERE t.id = p_tarea AND t.usuario_telegram_id = p_usuario
+    RETURNING *;
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION eliminar_recordatorio_config(p_usuario BIGINT, p_tarea INT, p_recordatorio INT)
+RETURNS BOOLEAN AS $$
+    WITH borrados AS (
+        DELETE FROM recordatorios_config rc
+         USING tareas t
+         WHERE rc.id = p_recordatorio
+           AND rc.tarea_id = p_tarea
+           AND t.id = rc.tarea_id
+           AND t.usuario_telegram_id = p_usuario
+        RETURNING rc.id
+    )
+    SELECT count(*) > 0 FROM borrados;
+$$ LANGUAGE sql;
+
+-- Historial por usuario y contacto
+CREATE INDEX IF NOT EXISTS idx_historial_usuario_contacto
+    ON historial_interacciones(usuario_telegram_id, contacto_id, created_at DESC);
+
+-- =============================================
+-- 20. CREAR TAREA CON RECORDATORIOS (atómico)
+-- =============================================
+-- Inserta la tarea y todos sus recordatorios en una sola transacción.
+-- p_tarea y p_recordatorios son JSON con las columnas de cada tabla.
+-- Devuelve la tarea con sus recordatorios en "recordatorios".
+CREATE OR REPLACE FUNCTION crear_tarea_con_recordatorios(
+    p_usuario BIGINT,
+    p_tarea JSONB,
+    p_recordatorios JSONB DEFAULT '[]'
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_tarea tareas;
+BEGIN
+    INSERT INTO tareas (
+        usuario_telegram_id, titulo, descripcion, contacto_id, proyecto_id,
+        fecha_vencimiento, estado, prioridad, frecuencia_repeticion,
+        canal_notificacion, plantilla_id
+    )
+    SELECT p_usuario, t.titulo, t.descripcion, t.contacto_id, t.proyecto_id,
+           t.fecha_vencimiento, COALESCE(t.estado, 'pendiente'), COALESCE(t.prioridad, 'media'),
+           t.frecuencia_repeticion, COALESCE(t.canal_notificacion, 'telegram'), t.plantilla_id
+      FROM jsonb_populate_record(NULL::tareas, p_tarea) t
+    RETURNING * INTO v_tarea;
+    
+    INSERT INTO recordatorios_config (tarea_id, dias_antes, hora, canal, activo)
+    SELECT v_tarea.id, COALESCE(r.dias_antes, 0), COALESCE(r.hora, '09:00'),
+           COALESCE(r.canal, 'telegram'), COALESCE(r.activo, TRUE)
+      FROM jsonb_populate_recordset(NULL::recordatorios_config, COALESCE(p_recordatorios, '[]')) r;
+    
+    RETURN (to_jsonb(v_tarea) - 'fts') || jsonb_build_object(
+        'recordatorios', COALESCE((
+            SELECT jsonb_agg(to_jsonb(rc) ORDER BY rc.dias_antes DESC)
+              FROM recordatorios_config rc
+             WHERE rc.tarea_id = v_tarea.id
+        ), '[]')
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- =============================================
+-- 21. REGISTRO DE USUARIOS (idempotente)
+-- =============================================
+-- Alta con ON CONFLICT DO NOTHING: solo la llamada que inserta la fila
+-- crea las plantillas por defecto (p_plantillas, JSON desde la app), en
+-- la misma transacción. Registros concurrentes devuelven el mismo usuario.
+CREATE OR REPLACE FUNCTION registrar_usuario(
+    p_telegram_id BIGINT,
+    p_nombre VARCHAR,
+    p_email VARCHAR DEFAULT NULL,
+    p_timezone VARCHAR DEFAULT 'America/Argentina/Buenos_Aires',
+    p_plantillas JSONB DEFAULT '[]'
+)
+RETURNS usuarios AS $$
+DECLARE
+    v_usuario usuarios;
+BEGIN
+    INSERT INTO usuarios (telegram_id, nombre, email, timezone)
+    VALUES (p_telegram_id, p_nombre, p_email, p_timezone)
+    ON CONFLICT (telegram_id) DO NOTHING
+    RETURNING * INTO v_usuario;
+    
+    IF FOUND THEN
+        INSERT INTO plantillas (usuario_telegram_id, nombre, tipo, asunto, mensaje, es_default)
+        SELECT p_telegram_id, p.nombre, p.tipo, p.asunto, p.mensaje, COALESCE(p.es_default, FALSE)
+          FROM jsonb_populate_recordset(NULL::plantillas, COALESCE(p_plantillas, '[]')) p;
+    ELSE
+        SELECT * INTO v_usuario FROM usuarios WHERE telegram_id = p_telegram_id;
+    END IF;
+    
+    RETURN v_usuario;
+END;
+$$ LANGUAGE plpgsql;
+
+-- =============================================
+-- 22. USUARIO EN EL LOG DE ENVÍOS
+-- =============================================
+-- Denormaliza el dueño en recordatorios_enviados para filtrar y paginar
+-- el log de un usuario por índice, sin pasar por tareas.
+ALTER TABLE recordatorios_enviados ADD COLUMN IF NOT EXISTS usuario_telegram_id BIGINT;
+
+UPDATE recordatorios_enviados re
+   SET usuario_telegram_id = t.usuario_telegram_id
+  FROM tareas t
+ WHERE re.tarea_id = t.id
+   AND re.usuario_telegram_id IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_recordatorios_enviados_usuario_fecha
+    ON recordatorios_enviados(usuario_telegram_id, fecha_envio DESC, id DESC);
+
+-- Completa el usuario desde la tarea si quien inserta no lo envía
+CREATE OR REPLACE FUNCTION set_recordatorios_enviados_usuario()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.usuario_telegram_id IS NULL AND NEW.tarea_id IS NOT NULL THEN
+        SELECT usuario_telegram_id INTO NEW.usuario_telegram_id
+          FROM tareas WHERE id = NEW.tarea_id;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS set_recordatorios_enviados_usuario ON recordatorios_enviados;
+CREATE TRIGGER set_recordatorios_enviados_usuario
+    BEFORE INSERT ON recordatorios_enviados
+    FOR EACH ROW
+    EXECUTE FUNCTION set_recordatorios_enviados_usuario();
+
 -- =============================================
 -- LISTO! Ejecutar todo este SQL en Supabase
 -- =============================================
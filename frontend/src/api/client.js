@@ -21,7 +21,7 @@ function getHeaders() {
 }
 
 // Fetch wrapper con manejo de errores
-async function apiFetch(endpoint, options = {}) {
+async function apiRequest(endpoint, options = {}) {
     const response = await fetch(`${API_BASE}${endpoint}`, {
         ...options,
         headers: {
@@ -35,9 +35,42 @@ async function apiFetch(endpoint, options = {}) {
         throw new Error(error.detail || 'Error en la solicitud');
     }
 
+    return response;
+}
+
+async function apiFetch(endpoint, options = {}) {
+    const response = await apiRequest(endpoint, options);
     return response.json();
 }
 
+// Listados paginados: devuelve { items, next_cursor } (cursor en el header X-Next-Cursor)
+async function apiFetchPagina(endpoint, params = {}, cursor = null) {
+    const query = new URLSearchParams();
+    Object.entries(params).forEach(([key, value]) => {
+        if (value) query.append(key, value);
+    });
+    if (cursor) query.append('cursor', cursor);
+
+    const queryString = query.toString();
+    const response = await apiRequest(`${endpoint}${queryString ? `?${queryString}` : ''}`);
+    return {
+        items: await response.json(),
+        next_cursor: response.headers.get('X-Next-Cursor')
+    };
+}
+
+// Sigue el cursor hasta traer todas las páginas (selects del frontend)
+export async function getTodasLasPaginas(getPagina) {
+    const items = [];
+    let cursor = null;
+    do {
+        const pagina = await getPagina(cursor);
+        items.push(...pagina.items);
+        cursor = pagina.next_cursor;
+    } while (cursor);
+    return items;
+}
+
 // =============================================
 // DASHBOARD
 // =============================================
@@ -48,9 +81,8 @@ export async function getDashboard() {
 // =============================================
 // CONTACTOS
 // =============================================
-export async function getContactos(search = '') {
-    const params = search ? `?search=${encodeURIComponent(search)}` : '';
-    return apiFetch(`/contactos${params}`);
+export async function getContactos(search = '', cursor = null, fields = '') {
+    return apiFetchPagina('/contactos', { search, fields }, cursor);
 }
 
 export async function getContacto(id) {
@@ -78,21 +110,22 @@ export async function deleteContacto(id) {
 // =============================================
 // TAREAS
 // =============================================
-export async function getTareas(filters = {}) {
-    const params = new URLSearchParams();
-    Object.entries(filters).forEach(([key, value]) => {
-        if (value) params.append(key, value);
-    });
-    const queryString = params.toString();
-    return apiFetch(`/tareas${queryString ? `?${queryString}` : ''}`);
+export async function getTareas(filters = {}, cursor = null) {
+    return apiFetchPagina('/tareas', filters, cursor);
+}
+
+export async function getTareasKanban(fields = '') {
+    const params = fields ? `?fields=${fields}` : '';
+    return apiFetch(`/tareas/kanban${params}`);
 }
 
-export async function getTareasKanban() {
-    return apiFetch('/tareas/kanban');
+export async function getTareasKanbanColumna(estado, cursor, fields = '') {
+    const params = fields ? `&fields=${fields}` : '';
+    return apiFetch(`/tareas/kanban/${estado}?cursor=${encodeURIComponent(cursor)}${params}`);
 }
 
-export async function getTareasHoy() {
-    return apiFetch('/tareas/hoy');
+export async function getTareasHoy(cursor = null) {
+    return apiFetchPagina('/tareas/hoy', {}, cursor);
 }
 
 export async function getTarea(id) {
@@ -126,9 +159,8 @@ export async function deleteTarea(id) {
 // =============================================
 // PROYECTOS
 // =============================================
-export async function getProyectos(estado = '') {
-    const params = estado ? `?estado=${estado}` : '';
-    return apiFetch(`/proyectos${params}`);
+export async function getProyectos(estado = '', cursor = null) {
+    return apiFetchPagina('/proyectos', { estado }, cursor);
 }
 
 export async function getProyecto(id) {
@@ -156,9 +188,8 @@ export async function deleteProyecto(id) {
 // =============================================
 // PLANTILLAS
 // =============================================
-export async function getPlantillas(tipo = '') {
-    const params = tipo ? `?tipo=${tipo}` : '';
-    return apiFetch(`/plantillas${params}`);
+export async function getPlantillas(tipo = '', cursor = null) {
+    return apiFetchPagina('/plantillas', { tipo }, cursor);
 }
 
 export async function getPlantilla(id) {
@@ -1,10 +1,12 @@
 import { useState, useEffect } from 'react';
 import { getContactos, createContacto, updateContacto, deleteContacto } from '../api/client';
+import { usePaginado } from '../hooks/usePaginado';
 
 function Contactos() {
-    const [contactos, setContactos] = useState([]);
-    const [loading, setLoading] = useState(true);
     const [search, setSearch] = useState('');
+    const {
+        items: contactos, loading, hayMas, cargandoMas, recargar: loadContactos, cargarMas
+    } = usePaginado((cursor) => getContactos(search, cursor));
     const [showModal, setShowModal] = useState(false);
     const [editingContacto, setEditingContacto] = useState(null);
     const [formData, setFormData] = useState({
@@ -19,18 +21,6 @@ function Contactos() {
         loadContactos();
     }, []);
 
-    const loadContactos = async () => {
-        try {
-            setLoading(true);
-            const data = await getContactos(search);
-            setContactos(data);
-        } catch (err) {
-            console.error('Error cargando contactos:', err);
-        } finally {
-            setLoading(false);
-        }
-    };
-
     const handleSearch = (e) => {
         e.preventDefault();
         loadContactos();
@@ -155,6 +145,13 @@ function Contactos() {
                     ))
                 )}
             </div>
+            {!loading && hayMas && (
+                <div style={{ textAlign: 'center', marginTop: '16px' }}>
+                    <button className="btn btn-secondary" onClick={cargarMas} disabled={cargandoMas}>
+                        {cargandoMas ? 'Cargando...' : 'Cargar más'}
+                    </button>
+                </div>
+            )}
 
             {/* Modal */}
             {showModal && (
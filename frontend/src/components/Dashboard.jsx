@@ -1,9 +1,10 @@
 import { useState, useEffect } from 'react';
-import { getDashboard, getTareasKanban, cambiarEstadoTarea } from '../api/client';
+import { getDashboard, cambiarEstadoTarea } from '../api/client';
+import { useKanban } from '../hooks/useKanban';
 
 function Dashboard() {
     const [stats, setStats] = useState(null);
-    const [kanban, setKanban] = useState(null);
+    const { kanban, recargar: recargarKanban, cargarMas } = useKanban('summary');
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState(null);
 
@@ -14,12 +15,11 @@ function Dashboard() {
     const loadData = async () => {
         try {
             setLoading(true);
-            const [dashboardData, kanbanData] = await Promise.all([
+            const [dashboardData] = await Promise.all([
                 getDashboard(),
-                getTareasKanban()
+                recargarKanban()
             ]);
             setStats(dashboardData);
-            setKanban(kanbanData);
         } catch (err) {
             setError(err.message);
         } finally {
@@ -161,10 +161,10 @@ function Dashboard() {
                                 >
                                     <div className={`kanban-column-header ${col.key}`}>
                                         <span>{col.emoji} {col.label}</span>
-                                        <span className="kanban-count">{kanban[col.key]?.length || 0}</span>
+                                        <span className="kanban-count">{kanban[col.key]?.total || 0}</span>
                                     </div>
                                     <div className="kanban-cards">
-                                        {kanban[col.key]?.map((tarea) => (
+                                        {kanban[col.key]?.items.map((tarea) => (
                                             <div
                                                 key={tarea.id}
                                                 className={`kanban-card prioridad-${tarea.prioridad}`}
@@ -182,11 +182,16 @@ function Dashboard() {
                                                 </div>
                                             </div>
                                         ))}
-                                        {(!kanban[col.key] || kanban[col.key].length === 0) && (
+                                        {(!kanban[col.key] || kanban[col.key].items.length === 0) && (
                                             <div className="empty-state" style={{ padding: '24px', background: 'transparent' }}>
                                                 <p style={{ fontSize: '0.8rem' }}>Sin tareas</p>
                                             </div>
                                         )}
+                                        {kanban[col.key]?.next_cursor && (
+                                            <button className="btn btn-sm btn-ghost" onClick={() => cargarMas(col.key)}>
+                                                Cargar más
+                                            </button>
+                                        )}
                                     </div>
                                 </div>
                             ))}
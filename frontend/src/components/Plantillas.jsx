@@ -1,9 +1,11 @@
 import { useState, useEffect } from 'react';
 import { getPlantillas, createPlantilla, updatePlantilla, deletePlantilla, previewPlantilla } from '../api/client';
+import { usePaginado } from '../hooks/usePaginado';
 
 function Plantillas() {
-    const [plantillas, setPlantillas] = useState([]);
-    const [loading, setLoading] = useState(true);
+    const {
+        items: plantillas, loading, hayMas, cargandoMas, recargar: loadPlantillas, cargarMas
+    } = usePaginado((cursor) => getPlantillas('', cursor));
     const [showModal, setShowModal] = useState(false);
     const [showPreview, setShowPreview] = useState(false);
     const [previewContent, setPreviewContent] = useState(null);
@@ -30,18 +32,6 @@ function Plantillas() {
         loadPlantillas();
     }, []);
 
-    const loadPlantillas = async () => {
-        try {
-            setLoading(true);
-            const data = await getPlantillas();
-            setPlantillas(data);
-        } catch (err) {
-            console.error('Error cargando plantillas:', err);
-        } finally {
-            setLoading(false);
-        }
-    };
-
     const openModal = (plantilla = null) => {
         if (plantilla) {
             setEditingPlantilla(plantilla);
@@ -185,6 +175,13 @@ function Plantillas() {
                     ))}
                 </div>
             )}
+            {hayMas && (
+                <div style={{ textAlign: 'center', marginTop: '16px' }}>
+                    <button className="btn btn-secondary" onClick={cargarMas} disabled={cargandoMas}>
+                        {cargandoMas ? 'Cargando...' : 'Cargar más'}
+                    </button>
+                </div>
+            )}
 
             {/* Modal Crear/Editar */}
             {showModal && (
@@ -1,10 +1,12 @@
 import { useState, useEffect } from 'react';
-import { getProyectos, createProyecto, updateProyecto, deleteProyecto, getContactos } from '../api/client';
+import { getProyectos, createProyecto, updateProyecto, deleteProyecto, getContactos, getTodasLasPaginas } from '../api/client';
+import { usePaginado } from '../hooks/usePaginado';
 
 function Proyectos() {
-    const [proyectos, setProyectos] = useState([]);
+    const {
+        items: proyectos, loading, hayMas, cargandoMas, recargar, cargarMas
+    } = usePaginado((cursor) => getProyectos('', cursor));
     const [contactos, setContactos] = useState([]);
-    const [loading, setLoading] = useState(true);
     const [showModal, setShowModal] = useState(false);
     const [editingProyecto, setEditingProyecto] = useState(null);
     const [formData, setFormData] = useState({
@@ -15,22 +17,16 @@ function Proyectos() {
     });
 
     useEffect(() => {
-        loadData();
+        recargar();
+        loadContactos();
     }, []);
 
-    const loadData = async () => {
+    // Select de contactos: solo id y nombre, siguiendo todas las páginas
+    const loadContactos = async () => {
         try {
-            setLoading(true);
-            const [proyectosData, contactosData] = await Promise.all([
-                getProyectos(),
-                getContactos()
-            ]);
-            setProyectos(proyectosData);
-            setContactos(contactosData);
+            setContactos(await getTodasLasPaginas((cursor) => getContactos('', cursor, 'id,nombre')));
         } catch (err) {
-            console.error('Error cargando datos:', err);
-        } finally {
-            setLoading(false);
+            console.error('Error cargando contactos:', err);
         }
     };
 
@@ -69,7 +65,7 @@ function Proyectos() {
                 await createProyecto(data);
             }
             closeModal();
-            loadData();
+            recargar();
         } catch (err) {
             alert('Error guardando proyecto: ' + err.message);
         }
@@ -79,7 +75,7 @@ function Proyectos() {
         if (!confirm('¿Eliminar este proyecto?')) return;
         try {
             await deleteProyecto(id);
-            loadData();
+            recargar();
         } catch (err) {
             alert('Error eliminando proyecto');
         }
@@ -160,6 +156,13 @@ function Proyectos() {
                     ))}
                 </div>
             )}
+            {hayMas && (
+                <div style={{ textAlign: 'center', marginTop: '16px' }}>
+                    <button className="btn btn-secondary" onClick={cargarMas} disabled={cargandoMas}>
+                        {cargandoMas ? 'Cargando...' : 'Cargar más'}
+                    </button>
+                </div>
+            )}
 
             {/* Modal */}
             {showModal && (
@@ -1,9 +1,13 @@
 import { useState, useEffect } from 'react';
-import { getTareas, getTareasKanban, createTarea, updateTarea, deleteTarea, cambiarEstadoTarea, getContactos } from '../api/client';
+import { getTareas, createTarea, updateTarea, deleteTarea, cambiarEstadoTarea, getContactos, getTodasLasPaginas } from '../api/client';
+import { usePaginado } from '../hooks/usePaginado';
+import { useKanban } from '../hooks/useKanban';
 
 function Tareas() {
-    const [tareas, setTareas] = useState([]);
-    const [kanban, setKanban] = useState(null);
+    const {
+        items: tareas, hayMas, cargandoMas, recargar: recargarLista, cargarMas: cargarMasLista
+    } = usePaginado((cursor) => getTareas({}, cursor));
+    const { kanban, recargar: recargarKanban, cargarMas } = useKanban();
     const [contactos, setContactos] = useState([]);
     const [loading, setLoading] = useState(true);
     const [viewMode, setViewMode] = useState('kanban'); // 'kanban' o 'list'
@@ -20,20 +24,18 @@ function Tareas() {
     });
 
     useEffect(() => {
-        loadData();
+        loadContactos();
     }, []);
 
+    useEffect(() => {
+        loadData();
+    }, [viewMode]);
+
+    // Solo la vista activa: el Kanban no trae la lista completa (ni el historial completado)
     const loadData = async () => {
         try {
             setLoading(true);
-            const [tareasData, kanbanData, contactosData] = await Promise.all([
-                getTareas(),
-                getTareasKanban(),
-                getContactos()
-            ]);
-            setTareas(tareasData);
-            setKanban(kanbanData);
-            setContactos(contactosData);
+            await (viewMode === 'list' ? recargarLista() : recargarKanban());
         } catch (err) {
             console.error('Error cargando datos:', err);
         } finally {
@@ -41,6 +43,15 @@ function Tareas() {
         }
     };
 
+    // Select de contactos: solo id y nombre, siguiendo todas las páginas
+    const loadContactos = async () => {
+        try {
+            setContactos(await getTodasLasPaginas((cursor) => getContactos('', cursor, 'id,nombre')));
+        } catch (err) {
+            console.error('Error cargando contactos:', err);
+        }
+    };
+
     const handleDragStart = (e, tareaId, estadoActual) => {
         e.dataTransfer.setData('tareaId', tareaId);
         e.dataTransfer.setData('estadoActual', estadoActual);
@@ -180,10 +191,10 @@ function Tareas() {
                         >
                             <div className={`kanban-column-header ${col.key}`}>
                                 <span>{col.emoji} {col.label}</span>
-                                <span className="kanban-count">{kanban[col.key]?.length || 0}</span>
+                                <span className="kanban-count">{kanban[col.key]?.total || 0}</span>
                             </div>
                             <div className="kanban-cards">
-                                {kanban[col.key]?.map((tarea) => (
+                                {kanban[col.key]?.items.map((tarea) => (
                                     <div
                                         key={tarea.id}
                                         className={`kanban-card prioridad-${tarea.prioridad}`}
@@ -202,11 +213,16 @@ function Tareas() {
                                         </div>
                                     </div>
                                 ))}
-                                {(!kanban[col.key] || kanban[col.key].length === 0) && (
+                                {(!kanban[col.key] || kanban[col.key].items.length === 0) && (
                                     <div style={{ padding: '24px', textAlign: 'center', color: 'var(--gray-400)', fontSize: '0.875rem' }}>
                                         Arrastra tareas aquí
                                     </div>
                                 )}
+                                {kanban[col.key]?.next_cursor && (
+                                    <button className="btn btn-sm btn-ghost" onClick={() => cargarMas(col.key)}>
+                                        Cargar más
+                                    </button>
+                                )}
                             </div>
                         </div>
                     ))}
@@ -251,6 +267,13 @@ function Tareas() {
                             </div>
                         ))
                     )}
+                    {hayMas && (
+                        <div style={{ textAlign: 'center', marginTop: '16px' }}>
+                            <button className="btn btn-secondary" onClick={cargarMasLista} disabled={cargandoMas}>
+                                {cargandoMas ? 'Cargando...' : 'Cargar más'}
+                            </button>
+                        </div>
+                    )}
                 </div>
             )}
 
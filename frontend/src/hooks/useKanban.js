@@ -0,0 +1,36 @@
+/**
+ * useKanban - Tablero Kanban por columnas paginadas
+ */
+import { useState } from 'react';
+import { getTareasKanban, getTareasKanbanColumna } from '../api/client';
+
+// Cada columna es { items, total, next_cursor } (ver GET /tareas/kanban)
+export function useKanban(fields = '') {
+    const [kanban, setKanban] = useState(null);
+
+    const recargar = async () => {
+        const data = await getTareasKanban(fields);
+        setKanban(data);
+        return data;
+    };
+
+    const cargarMas = async (estado) => {
+        const columna = kanban?.[estado];
+        if (!columna?.next_cursor) return;
+
+        try {
+            const pagina = await getTareasKanbanColumna(estado, columna.next_cursor, fields);
+            setKanban((prev) => ({
+                ...prev,
+                [estado]: {
+                    ...pagina,
+                    items: [...prev[estado].items, ...pagina.items]
+                }
+            }));
+        } catch (err) {
+            console.error('Error cargando tareas:', err);
+        }
+    };
+
+    return { kanban, recargar, cargarMas };
+}
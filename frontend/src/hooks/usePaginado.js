@@ -0,0 +1,46 @@
+/**
+ * usePaginado - Listados paginados por cursor
+ */
+import { useState, useRef } from 'react';
+
+// getPagina(cursor) -> { items, next_cursor } (ver apiFetchPagina en client.js)
+export function usePaginado(getPagina) {
+    const [items, setItems] = useState([]);
+    const [nextCursor, setNextCursor] = useState(null);
+    const [loading, setLoading] = useState(true);
+    const [cargandoMas, setCargandoMas] = useState(false);
+
+    // Siempre la última versión (puede depender de filtros del componente)
+    const getPaginaRef = useRef(getPagina);
+    getPaginaRef.current = getPagina;
+
+    const recargar = async () => {
+        try {
+            setLoading(true);
+            const pagina = await getPaginaRef.current(null);
+            setItems(pagina.items);
+            setNextCursor(pagina.next_cursor);
+        } catch (err) {
+            console.error('Error cargando datos:', err);
+        } finally {
+            setLoading(false);
+        }
+    };
+
+    const cargarMas = async () => {
+        if (!nextCursor || cargandoMas) return;
+
+        try {
+            setCargandoMas(true);
+            const pagina = await getPaginaRef.current(nextCursor);
+            setItems((prev) => [...prev, ...pagina.items]);
+            setNextCursor(pagina.next_cursor);
+        } catch (err) {
+            console.error('Error cargando más datos:', err);
+        } finally {
+            setCargandoMas(false);
+        }
+    };
+
+    return { items, loading, hayMas: !!nextCursor, cargandoMas, recargar, cargarMas };
+}
@@ -7,9 +7,11 @@ No requiere autenticación ni Gemini AI.
 
 import os
 import re
+import heapq
+import asyncio
 import logging
 import datetime
-from typing import Optional, Tuple
+from typing import Optional, Tuple, List, Dict
 
 import pytz
 from dateutil import parser as dateutil_parser
@@ -55,6 +57,26 @@ except Exception as e:
 # Timezone Argentina
 TZ_AR = pytz.timezone('America/Argentina/Buenos_Aires')
 
+# Scheduler en memoria
+REMINDERS_WINDOW_HOURS = int(os.getenv("REMINDERS_WINDOW_HOURS", "24"))  # Horizonte cargado en el heap
+REMINDERS_LOAD_BATCH = int(os.getenv("REMINDERS_LOAD_BATCH", "500"))     # Filas por consulta al cargar
+REMINDERS_SEND_CONCURRENCY = int(os.getenv("REMINDERS_SEND_CONCURRENCY", "10"))  # Envíos simultáneos
+REMINDERS_RETRY_SECONDS = int(os.getenv("REMINDERS_RETRY_SECONDS", "60"))        # Reintento si falla un envío
+
+# Recurrentes atrasados más de REMINDERS_CATCHUP_GRACE_SECONDS (bot caído):
+# - once: se envía una sola vez y se salta a la próxima ocurrencia futura
+# - skip: no se envía, solo se salta a la próxima ocurrencia futura
+# - summary: un solo mensaje indicando cuántas repeticiones se perdieron
+CATCHUP_POLICIES = ('once', 'skip', 'summary')
+REMINDERS_CATCHUP_POLICY = os.getenv("REMINDERS_CATCHUP_POLICY", "once").lower()
+if REMINDERS_CATCHUP_POLICY not in CATCHUP_POLICIES:
+    logger.warning(
+        f"⚠️ REMINDERS_CATCHUP_POLICY inválida ({REMINDERS_CATCHUP_POLICY!r}); "
+        f"valores posibles: {', '.join(CATCHUP_POLICIES)}. Se usa 'once'"
+    )
+    REMINDERS_CATCHUP_POLICY = 'once'
+REMINDERS_CATCHUP_GRACE_SECONDS = int(os.getenv("REMINDERS_CATCHUP_GRACE_SECONDS", "300"))
+
 # Mapeo de días de la semana
 DIAS_SEMANA = {
     'lunes': MO, 'lun': MO,
@@ -259,32 +281,72 @@ def parse_reminder_message(text: str) -> Optional[dict]:
     return result
 
 
-def calculate_next_occurrence(current_time: datetime.datetime, pattern: str, now: datetime.datetime) -> Optional[datetime.datetime]:
-    """Calcula la próxima ocurrencia basada en el patrón de repetición."""
-    if not pattern:
-        return None
-    
+def _pattern_step(pattern: str):
+    """Intervalo de un patrón de repetición (timedelta o relativedelta), o None."""
     if pattern == 'daily':
-        return current_time + datetime.timedelta(days=1)
+        return datetime.timedelta(days=1)
     elif pattern == 'weekly':
-        return current_time + datetime.timedelta(weeks=1)
+        return datetime.timedelta(weeks=1)
     elif pattern == 'monthly':
-        return current_time + relativedelta(months=1)
+        return relativedelta(months=1)
     elif pattern == 'hourly':
-        return current_time + datetime.timedelta(hours=1)
+        return datetime.timedelta(hours=1)
     elif pattern.startswith('every_'):
         match = re.match(r'every_(\d+)_(hours?|days?)', pattern)
         if match:
             n = int(match.group(1))
             unit = match.group(2)
+            if n <= 0:
+                return None
             if 'hour' in unit:
-                return current_time + datetime.timedelta(hours=n)
+                return datetime.timedelta(hours=n)
             elif 'day' in unit:
-                return current_time + datetime.timedelta(days=n)
+                return datetime.timedelta(days=n)
     
     return None
 
 
+def advance_occurrence(current_time: datetime.datetime, pattern: str, now: datetime.datetime) -> Tuple[Optional[datetime.datetime], int]:
+    """
+    Salta directo a la primera ocurrencia posterior a now, sin iterar.
+    Devuelve (próxima ocurrencia, ocurrencias perdidas entre current_time y now).
+    """
+    if not pattern:
+        return None, 0
+    
+    step = _pattern_step(pattern)
+    if step is None:
+        return None, 0
+    
+    if isinstance(step, relativedelta):
+        # Mensual: meses enteros desde el último trigger_time guardado. Ese valor ya
+        # viene recortado por avances anteriores (31/01 -> 28/02 -> 28/03), así que
+        # el día del mes no se recupera; el salto solo evita iterar mes a mes
+        months = (now.year - current_time.year) * 12 + (now.month - current_time.month)
+        k = max(months, 1)
+        next_time = current_time + relativedelta(months=k)
+        if next_time <= now:
+            k += 1
+            next_time = current_time + relativedelta(months=k)
+    else:
+        k = max(int((now - current_time) // step) + 1, 1)
+        next_time = current_time + k * step
+    
+    return next_time, k - 1
+
+
+def parse_trigger_time(trigger_str: str) -> datetime.datetime:
+    """Convierte el trigger_time de la DB a datetime en hora Argentina."""
+    try:
+        dt = datetime.datetime.fromisoformat(trigger_str.replace('Z', '+00:00'))
+    except ValueError:
+        dt = datetime.datetime.strptime(trigger_str, '%Y-%m-%d %H:%M:%S')
+    
+    if dt.tzinfo is None:
+        return TZ_AR.localize(dt)
+    return dt.astimezone(TZ_AR)
+
+
 # --- HANDLERS DE TELEGRAM ---
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -400,6 +462,9 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         resp = supabase.table('reminders').insert(reminder_data).execute()
         
         if resp.data:
+            # Agendar en memoria: dispara en el segundo exacto
+            reminder_heap.schedule(resp.data[0]['id'], trigger_dt)
+            
             # Mensaje de confirmación
             date_str = trigger_dt.strftime('%d/%m/%Y')
             time_str = trigger_dt.strftime('%H:%M')
@@ -432,88 +497,259 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(f"❌ Error: {e}")
 
 
-# --- CRON JOB PARA ENVIAR RECORDATORIOS ---
+# --- ENVÍO DE RECORDATORIOS ---
 
-async def send_reminder_notification(application, reminder: dict):
-    """Envía la notificación de un recordatorio."""
-    try:
+async def send_reminder_notification(application, reminder: dict, now: datetime.datetime) -> Optional[dict]:
+    """
+    Envía la notificación de un recordatorio aplicando la política de atraso.
+    Devuelve la fila con su nuevo estado (sin escribirla), o None si falló.
+    """
+    trigger_dt = parse_trigger_time(reminder['trigger_time'])
+    next_time, missed = advance_occurrence(trigger_dt, reminder.get('repeat_pattern'), now)
+    
+    # Atrasado más allá del margen (p. ej. el bot estuvo caído)
+    late = (now - trigger_dt).total_seconds() > REMINDERS_CATCHUP_GRACE_SECONDS
+    row = dict(reminder)
+    
+    if late and next_time and REMINDERS_CATCHUP_POLICY == 'skip':
+        # Recurrente atrasado: no se envía, solo se avanza a la próxima ocurrencia
+        logger.info(f"⏭ Recordatorio {reminder['id']} atrasado, se omite ({missed + 1} perdidos)")
+    else:
         message = f"⏰ **RECORDATORIO**\n\n{reminder['message']}"
+        if late and next_time and REMINDERS_CATCHUP_POLICY == 'summary' and missed:
+            message += f"\n\n_({missed + 1} repeticiones perdidas mientras el bot estuvo fuera de línea)_"
         
-        sent = await application.bot.send_message(
-            chat_id=reminder['chat_id'],
-            text=message,
-            parse_mode='Markdown'
-        )
+        try:
+            sent = await application.bot.send_message(
+                chat_id=reminder['chat_id'],
+                text=message,
+                parse_mode='Markdown'
+            )
+            logger.info(f"📤 Recordatorio {reminder['id']} enviado")
+            
+        except Exception as e:
+            logger.error(f"❌ Error enviando recordatorio {reminder['id']}: {e}")
+            return None
         
-        # Actualizar last_message_id
-        supabase.table('reminders').update({
-            'last_message_id': sent.message_id
-        }).eq('id', reminder['id']).execute()
+        row['last_message_id'] = sent.message_id
+    
+    # Manejar repetición o desactivar
+    if next_time:
+        row['trigger_time'] = next_time.isoformat()
+        logger.info(f"🔁 Reprogramado para {next_time}")
+    else:
+        row['is_active'] = False
+    
+    return row
+
+
+# Filas ya enviadas cuyo nuevo estado no se pudo guardar (id -> fila)
+_unsaved_state: Dict[int, dict] = {}
+
+
+def _schedule_retry(reminder_ids: List[int], now: datetime.datetime):
+    """Vuelve a agendar ids en el heap para reintentar en REMINDERS_RETRY_SECONDS."""
+    retry_at = now + datetime.timedelta(seconds=REMINDERS_RETRY_SECONDS)
+    for reminder_id in reminder_ids:
+        reminder_heap.schedule(reminder_id, retry_at)
+
+
+async def process_due_reminders(application, reminder_ids: List[int]):
+    """
+    Trae de la DB solo los recordatorios vencidos, los envía en paralelo
+    (hasta REMINDERS_SEND_CONCURRENCY a la vez) y guarda el nuevo estado
+    de todos con un único upsert. El cliente de Supabase es síncrono, así que
+    la consulta y el upsert corren en un hilo con asyncio.to_thread.
+    El heap se avanza recién cuando el upsert se guardó; si falla, las filas
+    quedan en _unsaved_state y se reintenta solo la escritura, sin reenviar.
+    """
+    now = datetime.datetime.now(TZ_AR)
+    
+    # Ya enviados en un tick anterior: solo falta guardar su estado
+    updates = [_unsaved_state.pop(i) for i in reminder_ids if i in _unsaved_state]
+    guardar = {row['id'] for row in updates}
+    pendientes = [i for i in reminder_ids if i not in guardar]
+    
+    reminders = []
+    if pendientes:
+        try:
+            query = supabase.table('reminders').select('*')\
+                .in_('id', pendientes)\
+                .eq('is_active', True)\
+                .lte('trigger_time', now.isoformat())
+            resp = await asyncio.to_thread(query.execute)
+            reminders = resp.data or []
+        except Exception as e:
+            # Ya salieron del heap: reagendarlos para no perderlos hasta el próximo reinicio
+            logger.error(f"❌ Error trayendo {len(pendientes)} recordatorios vencidos: {e}")
+            _schedule_retry(pendientes, now)
+    
+    if reminders:
+        semaphore = asyncio.Semaphore(REMINDERS_SEND_CONCURRENCY)
         
-        logger.info(f"📤 Recordatorio {reminder['id']} enviado")
+        async def send(reminder: dict) -> Optional[dict]:
+            async with semaphore:
+                try:
+                    return await send_reminder_notification(application, reminder, now)
+                except Exception as e:
+                    logger.error(f"Error procesando recordatorio {reminder['id']}: {e}")
+                    return None
         
-        # Manejar repetición o desactivar
-        if reminder.get('repeat_pattern'):
-            trigger_str = reminder['trigger_time']
-            try:
-                current = datetime.datetime.fromisoformat(trigger_str.replace('Z', '+00:00'))
-            except:
-                current = datetime.datetime.strptime(trigger_str, '%Y-%m-%d %H:%M:%S')
-            
-            if current.tzinfo is None:
-                current = TZ_AR.localize(current)
-            
-            now = datetime.datetime.now(TZ_AR)
-            next_time = calculate_next_occurrence(current, reminder['repeat_pattern'], now)
-            
-            if next_time:
-                supabase.table('reminders').update({
-                    'trigger_time': next_time.isoformat()
-                }).eq('id', reminder['id']).execute()
-                logger.info(f"🔁 Reprogramado para {next_time}")
+        results = await asyncio.gather(*(send(r) for r in reminders))
+        
+        for reminder, row in zip(reminders, results):
+            if row is None:
+                # Falló el envío: reintentar más tarde
+                _schedule_retry([reminder['id']], now)
             else:
-                supabase.table('reminders').update({'is_active': False}).eq('id', reminder['id']).execute()
-        else:
-            supabase.table('reminders').update({'is_active': False}).eq('id', reminder['id']).execute()
-            
+                updates.append(row)
+    
+    if not updates:
+        return
+    
+    # Filas completas: un solo upsert actualiza last_message_id, trigger_time e is_active
+    try:
+        await asyncio.to_thread(supabase.table('reminders').upsert(updates).execute)
     except Exception as e:
-        logger.error(f"❌ Error enviando recordatorio {reminder['id']}: {e}")
+        logger.error(f"❌ Error guardando estado de {len(updates)} recordatorios: {e}")
+        for row in updates:
+            _unsaved_state[row['id']] = row
+        _schedule_retry([row['id'] for row in updates], now)
+        return
+    
+    for row in updates:
+        if row['is_active']:
+            reminder_heap.schedule(row['id'], parse_trigger_time(row['trigger_time']))
 
 
-async def check_reminders_job(context: ContextTypes.DEFAULT_TYPE):
-    """Job que revisa y envía recordatorios pendientes."""
-    try:
-        now = datetime.datetime.now(TZ_AR)
-        logger.info(f"🔍 Checking reminders at {now.isoformat()}")
+# --- SCHEDULER EN MEMORIA ---
+
+class ReminderHeap:
+    """
+    Min-heap de (trigger_time, id) con los recordatorios activos de las
+    próximas REMINDERS_WINDOW_HOURS horas.
+    Un único loop duerme hasta el próximo vencimiento (o hasta que un alta
+    se adelante), así cada recordatorio dispara en su segundo exacto.
+    La DB solo se consulta para los vencidos y para extender la ventana.
+    """
+    
+    def __init__(self, window_hours: int, load_batch: int):
+        self.window = datetime.timedelta(hours=window_hours)
+        self.load_batch = load_batch
+        self._heap: List[Tuple[datetime.datetime, int]] = []
+        # id -> trigger_time vigente; las entradas viejas del heap se ignoran al salir
+        self._scheduled: Dict[int, datetime.datetime] = {}
+        # Todo recordatorio activo con trigger_time <= horizon está en memoria
+        self._horizon: Optional[datetime.datetime] = None
+        self._wakeup = asyncio.Event()
+    
+    def schedule(self, reminder_id: int, trigger_dt: datetime.datetime):
+        """Agenda o reprograma un recordatorio (alta o tras un envío)."""
+        if self._horizon is not None and trigger_dt > self._horizon:
+            # Fuera de la ventana: lo trae la próxima carga
+            self._scheduled.pop(reminder_id, None)
+            return
         
-        # Traer todos los activos
-        resp = supabase.table('reminders').select('*').eq('is_active', True).execute()
+        self._scheduled[reminder_id] = trigger_dt
+        heapq.heappush(self._heap, (trigger_dt, reminder_id))
         
-        if not resp.data:
-            return
+        # Si pasó a ser el más próximo, despertar al loop
+        if self._heap[0][1] == reminder_id:
+            self._wakeup.set()
+    
+    def _pop_due(self, now: datetime.datetime) -> List[int]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            trigger_dt, reminder_id = heapq.heappop(self._heap)
+            if self._scheduled.get(reminder_id) == trigger_dt:
+                del self._scheduled[reminder_id]
+                due.append(reminder_id)
+        return due
+    
+    async def _load_window(self, now: datetime.datetime):
+        """
+        Carga incremental: de horizon a now + window, en lotes por (trigger_time, id).
+        Las consultas (cliente síncrono) corren en un hilo para no frenar el event loop.
+        """
+        hasta = now + self.window
+        cursor = None
         
-        for r in resp.data:
+        while True:
+            query = supabase.table('reminders').select('id, trigger_time')\
+                .eq('is_active', True)\
+                .lte('trigger_time', hasta.isoformat())
+            
+            if cursor:
+                ts, last_id = cursor
+                query = query.or_(f'trigger_time.gt."{ts}",and(trigger_time.eq."{ts}",id.gt.{last_id})')
+            elif self._horizon is not None:
+                query = query.gt('trigger_time', self._horizon.isoformat())
+            
+            query = query.order('trigger_time').order('id').limit(self.load_batch)
+            rows = (await asyncio.to_thread(query.execute)).data or []
+            
+            for r in rows:
+                trigger_dt = parse_trigger_time(r['trigger_time'])
+                self._scheduled[r['id']] = trigger_dt
+                heapq.heappush(self._heap, (trigger_dt, r['id']))
+            
+            if len(rows) < self.load_batch:
+                break
+            cursor = (rows[-1]['trigger_time'], rows[-1]['id'])
+        
+        self._horizon = hasta
+        logger.info(f"📥 Heap de recordatorios: {len(self._scheduled)} agendados hasta {hasta.strftime('%d/%m %H:%M')}")
+    
+    async def run(self, application):
+        """Loop principal: dispara los vencidos y duerme hasta el próximo."""
+        while True:
             try:
-                trigger_str = r['trigger_time']
-                try:
-                    trigger_dt = datetime.datetime.fromisoformat(trigger_str.replace('Z', '+00:00'))
-                except ValueError:
-                    trigger_dt = datetime.datetime.strptime(trigger_str, '%Y-%m-%d %H:%M:%S')
+                now = datetime.datetime.now(TZ_AR)
                 
-                if trigger_dt.tzinfo is None:
-                    trigger_dt = TZ_AR.localize(trigger_dt)
-                else:
-                    trigger_dt = trigger_dt.astimezone(TZ_AR)
+                # Extender la ventana cuando se consumió la mitad
+                if self._horizon is None or now >= self._horizon - self.window / 2:
+                    await self._load_window(now)
                 
-                # Si ya pasó la hora, enviar
-                if trigger_dt <= now:
-                    await send_reminder_notification(context.application, r)
-                    
-            except Exception as parse_err:
-                logger.error(f"Error parseando recordatorio {r['id']}: {parse_err}")
+                due = self._pop_due(now)
+                if due:
+                    await process_due_reminders(application, due)
+                    continue
                 
-    except Exception as e:
-        logger.error(f"❌ Error en check_reminders_job: {e}")
+                wake_at = self._horizon - self.window / 2
+                if self._heap:
+                    wake_at = min(wake_at, self._heap[0][0])
+                
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(
+                        self._wakeup.wait(),
+                        timeout=max((wake_at - now).total_seconds(), 0)
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                    
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Error en el scheduler de recordatorios: {e}")
+                await asyncio.sleep(5)
+
+
+reminder_heap = ReminderHeap(REMINDERS_WINDOW_HOURS, REMINDERS_LOAD_BATCH)
+_scheduler_task: Optional[asyncio.Task] = None
+
+
+async def on_startup(application):
+    """Arranca el scheduler en memoria."""
+    global _scheduler_task
+    _scheduler_task = asyncio.create_task(reminder_heap.run(application))
+    logger.info("⏰ Scheduler de recordatorios iniciado")
+
+
+async def on_shutdown(application):
+    """Detiene el scheduler en memoria."""
+    if _scheduler_task:
+        _scheduler_task.cancel()
 
 
 # --- MAIN ---
@@ -523,7 +759,11 @@ def main():
     logger.info("🚀 Iniciando Bot de Recordatorios...")
     
     # Crear aplicación
-    app = ApplicationBuilder().token(TELEGRAM_TOKEN).build()
+    app = ApplicationBuilder()\
+        .token(TELEGRAM_TOKEN)\
+        .post_init(on_startup)\
+        .post_shutdown(on_shutdown)\
+        .build()
     
     # Registrar handlers
     app.add_handler(CommandHandler("start", start_command))
@@ -532,11 +772,6 @@ def main():
     app.add_handler(CommandHandler("mis_recordatorios", list_reminders_command))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
     
-    # Job para revisar recordatorios cada minuto
-    job_queue = app.job_queue
-    job_queue.run_repeating(check_reminders_job, interval=60, first=10)
-    logger.info("⏰ Job de recordatorios configurado (cada 60s)")
-    
     # Iniciar bot
     logger.info("✅ Bot iniciado. Esperando mensajes...")
     app.run_polling(drop_pending_updates=True)